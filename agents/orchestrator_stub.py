@@ -1,39 +1,25 @@
-def orchestrate(user_id, complaint_text, attachments=[]):
-    # 1. ClassifierAgent -> issue type
-    classifier_out = {
-        "issue_type": "Water supply",
-        "confidence": 0.93,
-        "highlights": ["no water"]
-    }
+import asyncio
 
-    # 2. MapperAgent -> department mapping
-    mapper_out = {
-        "department": "Water Board",
-        "contact": {"portal": "https://water.gov", "phone": "0801234567"},
-        "confidence": 0.91,
-        "justification": "Complaint contains water outage keywords."
-    }
+from backend.tools import orchestrator
 
-    # 3. PlannerAgent -> action plan
-    planner_out = {
-        "steps": [
-            "Take a photo of meter.",
-            "Submit complaint on Water Board portal.",
-            "Escalate if unresolved in 72 hours."
-        ],
-        "estimated_resolution_time": "48-72 hours"
-    }
+
+def orchestrate(user_id, complaint_text, attachments=[], state=None, city=None):
+    # Synchronous wrapper around the async ClassifierAgent -> MapperAgent ->
+    # PlannerAgent pipeline in backend/tools/orchestrator.py.
+    result = asyncio.run(orchestrator.orchestrate(user_id, complaint_text, state, city, attachments))
+    department = result["department"]
 
     final = {
-        "complaint_id": "c001",
+        "complaint_id": result["request_id"],
         "user_id": user_id,
-        "classification": classifier_out,
-        "department": mapper_out,
-        "action_plan": planner_out,
+        "classification": result["classification"],
+        "department": department,
+        "action_plan": result["action_plan"],
         "file_options": {"can_file": True, "file_payload": {}},
-        "memory_saved": True,
-        "explainability": "Mapped to Water Board based on keywords.",
-        "timestamps": {"created_at": "2025-11-29T00:00:00Z"}
+        "memory_saved": False,
+        "explainability": f"Mapped to {department.get('name')}: {department.get('justification')}",
+        "agents": result["stages"],
+        "timing_ms": result["timing_ms"]
     }
 
     return final
@@ -1,130 +1,127 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile
 from pydantic import BaseModel
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import uuid
+import asyncio
 import datetime
-import random
+import hashlib
 import json
+import logging
 import os
+import time
+import zlib
+from typing import Optional
+
+from backend.tools import (admission, analytics, archive, attachment_jobs, blobs, cache,
+                           classifier, department_lookup, escalation, incidents, lifecycle,
+                           metrics, orchestrator, profiling, search, storage, writer)
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+
+@app.middleware("http")
+async def limit_intake(request: Request, call_next):
+    # Registered before instrument, so it runs inside it and rejections
+    # still show up in the request metrics.
+    if request.url.path not in admission.INTAKE_PATHS:
+        return await call_next(request)
+
+    controller = admission.get_controller()
+    if not controller.acquire():
+        return JSONResponse({"detail": "Too many complaints in progress, retry shortly"},
+                            status_code=503, headers={"Retry-After": "1"})
+    try:
+        return await call_next(request)
+    finally:
+        controller.release()
+
+
+# multipart framing around the file in an upload
+UPLOAD_OVERHEAD = 64 * 1024
+
+
+@app.middleware("http")
+async def limit_upload(request: Request, call_next):
+    # Checked before the form is parsed: FastAPI spools the whole body to
+    # disk first, so a cap applied in the endpoint comes too late.
+    if request.method == "POST" and request.url.path == "/attachments":
+        length = request.headers.get("content-length")
+        if length is None or not length.isdigit():
+            return JSONResponse({"detail": "Content-Length required"}, status_code=411)
+        if int(length) > blobs.MAX_ATTACHMENT_BYTES + UPLOAD_OVERHEAD:
+            return JSONResponse({"detail": "Attachment too large"}, status_code=413)
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    start = time.perf_counter()
+    profiler = profiling.start()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        # route templates, not raw paths, so ids don't explode the label set
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+
+        metrics.REQUESTS.inc(method=request.method, path=path, status=status)
+        metrics.REQUEST_SECONDS.observe(elapsed, method=request.method, path=path)
+        length = request.headers.get("content-length")
+        if length and length.isdigit():
+            metrics.REQUEST_BYTES.observe(int(length), method=request.method, path=path)
+        if profiler is not None:
+            profiling.finish(profiler, request.method, path, elapsed)
+
+
+def load_indexes():
+    # The first call of each getter reads (or rebuilds) its index from the
+    # store; done here so no request waits behind it.
+    incidents.get_index()
+    analytics.get_analytics()
+    search.get_index()
+    lifecycle.get_view()
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    load_indexes()
+    # loads (memory-maps) the ML model, if configured, before the first request
+    classifier.get_classifier()
+    archive.start_compactor()
+    escalation.get_scheduler().start()
+    attachment_jobs.start_resume()
+
+
+@app.on_event("shutdown")
+def close_store():
+    analytics.get_analytics().flush()
+    incidents.get_index().close()
+    lifecycle.get_view().close()
+    escalation.close_scheduler()
+    search.close_index()
+    writer.close_writer()
+    storage.close_store()
+    attachment_jobs.close_jobs(wait=False)
+
 @app.get("/")
 def home():
     return {"message": "CivicAssist backend is running successfully!"}
 
 def simple_classify(text: str) -> dict:
-    t = text.lower()
-    highlights = []
-
-    if any(k in t for k in ["no water", "water supply", "water", "tap", "meter"]):
-        highlights.append("water")
-        return {"issue_type": "Water supply", "confidence": 0.93, "highlights": highlights}
-
-    if any(k in t for k in ["no electricity", "power cut", "power outage", "electricity", "meter not working"]):
-        highlights.append("electricity")
-        return {"issue_type": "Electricity supply", "confidence": 0.92, "highlights": highlights}
-
-    if any(k in t for k in ["garbage", "trash", "rubbish", "waste"]):
-        highlights.append("garbage")
-        return {"issue_type": "Garbage collection", "confidence": 0.9, "highlights": highlights}
-
-    if any(k in t for k in ["pothole", "road", "accident", "street", "traffic"]):
-        highlights.append("road damage")
-        return {"issue_type": "Road maintenance", "confidence": 0.9, "highlights": highlights}
-
-    return {"issue_type": "General civic", "confidence": 0.6, "highlights": []}
-
-def simple_map_department(classification: dict) -> dict:
-    issue = classification.get("issue_type", "").lower()
-
-    if "water" in issue:
-        return {
-            "name": "Water Board",
-            "contact": {"portal": "https://cms.bwssb.gov.in/module/complain/new_complaint", "phone": "0801234567"},
-            "confidence": 0.9,
-            "justification": "Water issues handled by Water Board."
-        }
-
-    if "electric" in issue:
-        return {
-            "name": "Electricity Dept",
-            "contact": {"portal": "https://bescom.karnataka.gov.in/english", "phone": "0807654321"},
-            "confidence": 0.9,
-            "justification": "Power outages handled by the Electricity Dept."
-        }
-
-    if "garbage" in issue:
-        return {
-            "name": "Sanitation Dept",
-            "contact": {"portal": "https://bwssb.karnataka.gov.in/info-1/About+BWSSB/en", "phone": "0801112222"},
-            "confidence": 0.9,
-            "justification": "Garbage management handled by Sanitation Dept."
-        }
-
-    if "road" in issue:
-        return {
-            "name": "Public Works",
-            "contact": {"portal": "https://kpwd.karnataka.gov.in/english", "phone": "0803334444"},
-            "confidence": 0.9,
-            "justification": "Road maintenance handled by Public Works."
-        }
+    return classifier.get_classifier().classify(text)
 
-    return {
-        "name": "Civic Helpdesk",
-        "contact": {"portal": "https://civicspace.in/", "phone": "0800000000"},
-        "confidence": 0.7,
-        "justification": "General civic category."
-    }
-
-def simple_plan(classification: dict) -> dict:
-    itype = classification.get("issue_type", "").lower()
-
-    if "water" in itype:
-        return {
-            "steps": [
-                "Take a photo of water meter.",
-                "Submit complaint on Water Board portal.",
-                "If unresolved in 48 hours, escalate."
-            ],
-            "estimated_resolution_time": "48-72 hours"
-        }
-
-    if "electric" in itype:
-        return {
-            "steps": [
-                "Note the outage time.",
-                "Check with neighbours.",
-                "Report to Electricity Dept portal.",
-                "Escalate after 24 hours."
-            ],
-            "estimated_resolution_time": "24-48 hours"
-        }
-
-    if "garbage" in itype:
-        return {
-            "steps": [
-                "Take photo of garbage pile.",
-                "Submit complaint on Sanitation portal.",
-                "Escalate if not cleared in 48 hours."
-            ],
-            "estimated_resolution_time": "24-72 hours"
-        }
-
-    if "road" in itype:
-        return {
-            "steps": [
-                "Take photo of pothole.",
-                "Mark location & submit to Public Works portal.",
-                "Escalate for urgent repairs if safety risk."
-            ],
-            "estimated_resolution_time": "7-14 days"
-        }
+def simple_map_department(classification: dict, state=None, city=None) -> dict:
+    return department_lookup.map_department(classification.get("issue_type", ""), state, city)
 
-    return {
-        "steps": ["Log complaint on Civic Helpdesk.", "Follow up after 72 hours."],
-        "estimated_resolution_time": "72+ hours"
-    }
+def simple_plan(classification: dict, state=None, city=None) -> dict:
+    return department_lookup.plan_for(classification.get("issue_type", ""), state, city)
 
 
 class ComplaintRequest(BaseModel):
@@ -135,6 +132,11 @@ class ComplaintRequest(BaseModel):
     attachments: list = []
 
 
+class BatchRequest(BaseModel):
+    # items are validated one by one so a bad row fails alone
+    complaints: list
+
+
 class ComplaintResponse(BaseModel):
     complaint_id: str
     classification: dict
@@ -143,126 +145,527 @@ class ComplaintResponse(BaseModel):
     status: str
     file_options: dict
     memory_saved: bool
+    timing_ms: dict = {}
+    deduplicated: bool = False
+    incident_id: Optional[str] = None
+    # acknowledged under load; the write is still queued
+    persistence_deferred: bool = False
 
 
-@app.post("/agent/resolve", response_model=ComplaintResponse)
-def resolve(complaint: ComplaintRequest):
+class StatusUpdate(BaseModel):
+    status: str
+    note: Optional[str] = None
 
-    classification = simple_classify(complaint.complaint_text)
-    department = simple_map_department(classification)
-    action_plan = simple_plan(classification)
 
-    complaint_id = "c-" + str(uuid.uuid4())
-    status = random.choice(["Pending", "In Progress", "Resolved"])
+MAX_BATCH_SIZE = 5000
 
-    try:
-        memory_file = "backend/memory/complaints.json"
-        os.makedirs(os.path.dirname(memory_file), exist_ok=True)
 
-        entry = {
-            "complaint_id": complaint_id,
-            "user_id": complaint.user_id,
-            "complaint_text": complaint.complaint_text,
-            "classification": classification,
-            "department": department,
-            "action_plan": action_plan,
-            "status": status,
-            "state": complaint.state,
-            "city": complaint.city,
-            "attachments": complaint.attachments,
-            "timestamp": datetime.datetime.utcnow().isoformat()
-        }
-
-        # Save JSON
-        data = []
-        if os.path.exists(memory_file):
-            with open(memory_file, "r", encoding="utf-8") as f:
-                try:
-                    data = json.load(f)
-                except:
-                    data = []
-
-        data.append(entry)
-
-        with open(memory_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-
-        # Save CSV
-        import csv
-        csv_file = "backend/memory/complaints.csv"
-        csv_exists = os.path.exists(csv_file)
-
-        with open(csv_file, "a", newline="", encoding="utf-8") as csvf:
-            writer = csv.writer(csvf)
-
-            if not csv_exists:
-                writer.writerow([
-                    "complaint_id",
-                    "user_id",
-                    "complaint_text",
-                    "issue_type",
-                    "department",
-                    "status",
-                    "state",
-                    "city",
-                    "timestamp",
-                    "attachments"
-                ])
-
-            writer.writerow([
-                complaint_id,
-                complaint.user_id,
-                complaint.complaint_text,
-                classification.get("issue_type"),
-                department.get("name"),
-                status,
-                complaint.state,
-                complaint.city,
-                entry["timestamp"],
-                ",".join(complaint.attachments)
-            ])
-
-        saved = True
+def make_entry(complaint: ComplaintRequest, complaint_id, classification, department,
+               action_plan, status, attachments) -> dict:
+    timestamp = datetime.datetime.utcnow().isoformat()
+    return {
+        "complaint_id": complaint_id,
+        "user_id": complaint.user_id,
+        "complaint_text": complaint.complaint_text,
+        "classification": classification,
+        "department": department,
+        "action_plan": action_plan,
+        "status": status,
+        "state": complaint.state,
+        "city": complaint.city,
+        "attachments": attachments,
+        "timestamp": timestamp,
+        "escalation_due": escalation.due_time(action_plan, timestamp)
+    }
 
+
+def release_incidents(entries, error):
+    # A complaint that never reached the store leaves its incident again.
+    if error is None:
+        return
+    written = getattr(error, "written", set())
+    lost = [e for e in entries if e["complaint_id"] not in written]
+    try:
+        incidents.get_index().retract(lost)
     except Exception:
-        saved = False
+        logger.exception("Could not take %d unsaved complaints out of their incidents", len(lost))
 
-    return {
+
+def find_duplicate(key, signature):
+    now = time.monotonic()
+    for filed, earlier_signature, response in cache.dedup_cache.get(key) or []:
+        if now - filed < cache.DEDUP_WINDOW and \
+                incidents.similarity(signature, earlier_signature) >= cache.DEDUP_SIMILARITY:
+            return response
+    return None
+
+
+def remember_submission(key, signature, response):
+    now = time.monotonic()
+    recent = [s for s in cache.dedup_cache.get(key) or [] if now - s[0] < cache.DEDUP_WINDOW]
+    recent.append((now, signature, response))
+    cache.dedup_cache.put(key, recent[-cache.DEDUP_PER_KEY:])
+
+
+@app.post("/agent/resolve", response_model=ComplaintResponse)
+async def resolve(complaint: ComplaintRequest):
+
+    # Same user, (nearly) the same text, same place within the dedup window:
+    # hand back the complaint we already filed.
+    dedup_key = signature = None
+    if cache.DEDUP_WINDOW > 0 and not complaint.attachments:
+        dedup_key = cache.dedup_key(complaint.user_id, complaint.state, complaint.city)
+        signature = incidents.signature(complaint.complaint_text)
+        earlier = find_duplicate(dedup_key, signature)
+        if earlier is not None:
+            return dict(earlier, deduplicated=True)
+
+    controller = admission.get_controller()
+    wait = controller.check(complaint.user_id, complaint.state, complaint.city)
+    if wait:
+        raise HTTPException(status_code=429, detail="Too many complaints, slow down",
+                            headers={"Retry-After": admission.retry_after(wait)})
+
+    backlog = writer.get_writer().backlog()
+    deferred = controller.degraded(backlog)
+    if deferred and backlog >= admission.MAX_DEFERRED:
+        admission.REJECTIONS.inc(reason="backlog")
+        raise HTTPException(status_code=503, detail="Intake is backed up, retry shortly",
+                            headers={"Retry-After": "5"})
+
+    result = await orchestrator.orchestrate(complaint.user_id, complaint.complaint_text,
+                                            complaint.state, complaint.city,
+                                            complaint.attachments)
+    classification = result["classification"]
+    department = result["department"]
+    action_plan = result["action_plan"]
+
+    complaint_id = "c-" + str(uuid.uuid4())
+    status = lifecycle.INITIAL_STATUS
+
+    saved = False
+    queued = False
+    incident_id = None
+    if result["attachments"] is not None:
+        try:
+            entry = make_entry(complaint, complaint_id, classification, department, action_plan,
+                               status, result["attachments"])
+            incident_id = entry["incident_id"] = await run_in_threadpool(
+                lambda: incidents.get_index().assign(entry)
+            )
+            future = writer.get_writer().submit([entry])
+            if deferred:
+                # failures are logged and counted by the writer
+                future.add_done_callback(lambda f: release_incidents([entry], f.exception()))
+                admission.DEFERRED.inc()
+                queued = True
+            else:
+                # resolves once the group commit holding it is on disk
+                await asyncio.wrap_future(future)
+                saved = True
+
+        except Exception as e:
+            # counted in civicassist_storage_failures_total
+            logger.exception("Could not save complaint %s", complaint_id)
+            saved = False
+            if incident_id is not None:
+                await run_in_threadpool(release_incidents, [entry], e)
+                incident_id = None
+
+    # deferred writes are picked up by the next read's catch-up
+    if saved:
+        await run_in_threadpool(lambda: analytics.get_analytics().refresh())
+        await run_in_threadpool(lambda: search.get_index().refresh())
+
+    response = {
         "complaint_id": complaint_id,
         "classification": classification,
         "department": department,
         "action_plan": action_plan,
         "status": status,
         "file_options": {"can_file": False, "file_payload": {}},
-        "memory_saved": saved
+        "memory_saved": saved,
+        "timing_ms": result["timing_ms"],
+        "incident_id": incident_id,
+        "persistence_deferred": queued
     }
 
+    if (saved or queued) and dedup_key is not None:
+        remember_submission(dedup_key, signature, response)
+
+    return response
+
+
+@app.post("/agent/resolve/batch")
+def resolve_batch(batch: BatchRequest):
+    if len(batch.complaints) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} complaints per batch")
+
+    failures = []
+    valid = []
+    for i, item in enumerate(batch.complaints):
+        try:
+            valid.append((i, ComplaintRequest(**item)))
+        except (TypeError, ValueError) as e:
+            failures.append({"index": i, "error": str(e)})
+
+    classifications = classifier.get_classifier().classify_batch(
+        [c.complaint_text for _, c in valid]
+    )
+
+    registry = department_lookup.get_registry()
+    incident_index = incidents.get_index()
+    results, entries = [], []
+    for (i, complaint), classification in zip(valid, classifications):
+        department, action_plan = registry.lookup(classification["issue_type"],
+                                                  complaint.state, complaint.city)
+
+        complaint_id = "c-" + str(uuid.uuid4())
+        status = lifecycle.INITIAL_STATUS
+        try:
+            attachments = [blobs.ingest_attachment(a) for a in complaint.attachments]
+            entry = make_entry(complaint, complaint_id, classification, department,
+                               action_plan, status, attachments)
+        except Exception as e:
+            failures.append({"index": i, "error": f"attachment: {e}"})
+            continue
+        entry["incident_id"] = incident_index.assign(entry)
+
+        entries.append(entry)
+        results.append({
+            "index": i,
+            "complaint_id": complaint_id,
+            "classification": classification,
+            "department": entry["department"],
+            "action_plan": entry["action_plan"],
+            "status": status,
+            "incident_id": entry["incident_id"]
+        })
+
+    written = set()
+    try:
+        writer.get_writer().write(entries)
+        written = {e["complaint_id"] for e in entries}
+    except storage.PartialAppend as e:
+        # e.g. some shards written, one failing: those complaints are on
+        # disk and must not be resubmitted
+        logger.exception("Saved only %d of a batch of %d complaints", len(e.written), len(entries))
+        written = e.written
+        release_incidents(entries, e)
+    except Exception as e:
+        logger.exception("Could not save a batch of %d complaints", len(entries))
+        release_incidents(entries, e)
+
+    for r in results:
+        r["saved"] = r["complaint_id"] in written
+        if not r["saved"]:
+            r["incident_id"] = None
+    saved = all(r["saved"] for r in results)
+
+    if written:
+        analytics.get_analytics().refresh()
+        search.get_index().refresh()
+
+    failures.sort(key=lambda f: f["index"])
+    return {"results": results, "failures": failures, "memory_saved": saved}
+
+
+def _etag(*parts) -> str:
+    # Weak: the same content may go out gzipped or not.
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8"))
+    return f'W/"{digest.hexdigest()[:24]}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    sent = request.headers.get("if-none-match")
+    return bool(sent) and (sent.strip() == "*" or etag in [t.strip() for t in sent.split(",")])
+
+
+def _json_with_etag(request: Request, body) -> Response:
+    # Clients revalidate with If-None-Match and skip the download on a match.
+    etag = _etag(body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
+
 
 # ✅ FIXED: HISTORY endpoint (you had it empty)
 @app.get("/agent/history/{user_id}")
-def get_history(user_id: str):
-    memory_file = "backend/memory/complaints.json"
-
-    if not os.path.exists(memory_file):
-        return {"history": []}
+def get_history(user_id: str, request: Request,
+                limit: int = Query(storage.HISTORY_PAGE_SIZE, ge=1, le=500),
+                cursor: Optional[str] = None):
+    store = storage.get_store()
+    try:
+        before = store.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
     try:
-        with open(memory_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except:
+        user_history, next_cursor = store.history(user_id, limit, before)
+    except (OSError, ValueError):
         raise HTTPException(status_code=500, detail="Could not read history file")
 
-    user_history = [c for c in data if c.get("user_id") == user_id]
+    # records keep the status they were filed with; the view has the latest
+    view = lifecycle.get_view()
+    view.refresh(store)
+    for item in user_history:
+        item["status"] = view.get(item.get("complaint_id")) or item.get("status")
+        if item.get("attachments"):
+            item["attachments"] = attachment_jobs.enrich(item["attachments"])
+
+    return _json_with_etag(request, {
+        "history": user_history,
+        "next_cursor": str(next_cursor) if next_cursor is not None else None
+    })
+
+
+@app.get("/complaints/search")
+def search_complaints(q: str,
+                      state: Optional[str] = None,
+                      city: Optional[str] = None,
+                      department: Optional[str] = None,
+                      issue_type: Optional[str] = None,
+                      since: Optional[str] = None,
+                      until: Optional[str] = None,
+                      limit: int = Query(20, ge=1, le=100),
+                      offset: int = Query(0, ge=0, le=10000)):
+    index = search.get_index()
+    index.refresh()
+    found = index.search(q, limit, offset,
+                         state=state, city=city, department=department, issue_type=issue_type,
+                         since=_date_bound(since, "since"),
+                         until=_date_bound(until, "until", end=True))
+
+    view = lifecycle.get_view()
+    view.refresh()
+    for item in found["results"]:
+        item["status"] = view.get(item["complaint_id"])
+
+    found["next_offset"] = offset + limit if offset + limit < found["total"] else None
+    return found
+
+
+@app.patch("/complaints/{complaint_id}/status")
+def update_status(complaint_id: str, update: StatusUpdate):
+    if update.status not in lifecycle.STATUSES:
+        raise HTTPException(status_code=400,
+                            detail=f"status must be one of {', '.join(lifecycle.STATUSES)}")
+    try:
+        return lifecycle.get_view().update(complaint_id, update.status, update.note)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Complaint not found")
+    except lifecycle.InvalidTransition as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/status/summary")
+def status_summary(since: Optional[str] = None, until: Optional[str] = None):
+    try:
+        since = datetime.date.fromisoformat(since).isoformat() if since else None
+        until = datetime.date.fromisoformat(until).isoformat() if until else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since/until must be YYYY-MM-DD")
+
+    view = lifecycle.get_view()
+    view.refresh()
+    return view.summary(since, until)
+
 
-    return {"history": user_history}
+@app.get("/escalations/overdue")
+def overdue_escalations(department: Optional[str] = None, limit: int = 100):
+    limit = max(1, min(limit, 1000))
+    scheduler = escalation.get_scheduler()
+    scheduler.fire()
+    return scheduler.overdue(department, limit)
+
+
+@metrics.collector
+def cache_samples():
+    caches = {"pipeline": cache.pipeline_cache.stats(), "dedup": cache.dedup_cache.stats()}
+    return [
+        ("civicassist_cache_%s_total" % field, "counter", f"Cache {field}.",
+         [({"cache": name}, stats[field]) for name, stats in caches.items()])
+        for field in ("hits", "misses", "evictions", "expirations")
+    ] + [
+        ("civicassist_cache_entries", "gauge", "Entries currently cached.",
+         [({"cache": name}, stats["size"]) for name, stats in caches.items()])
+    ]
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    return {
+        "pipeline": cache.pipeline_cache.stats(),
+        "dedup": dict(cache.dedup_cache.stats(), enabled=cache.DEDUP_WINDOW > 0)
+    }
+
+
+@app.get("/incidents")
+def list_incidents(state: Optional[str] = None, city: Optional[str] = None,
+                   issue_type: Optional[str] = None,
+                   min_size: int = Query(2, ge=1),
+                   limit: int = Query(50, ge=1, le=500)):
+    # Groups of near-duplicate complaints, largest first.
+    return {"incidents": incidents.get_index().query(state, city, issue_type, min_size, limit)}
+
+
+@app.get("/analytics/summary")
+def analytics_summary(request: Request, since: Optional[str] = None, until: Optional[str] = None):
+    try:
+        since = datetime.date.fromisoformat(since).isoformat() if since else None
+        until = datetime.date.fromisoformat(until).isoformat() if until else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since/until must be YYYY-MM-DD")
+
+    return _json_with_etag(request, analytics.get_analytics().summary(since, until))
+
+
+def _date_bound(value: Optional[str], name: str, end: bool = False) -> Optional[str]:
+    # Accepts a date or datetime; a bare end date covers that whole day.
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            day = datetime.date.fromisoformat(value)
+            return (day + datetime.timedelta(days=1)).isoformat() if end else day.isoformat()
+        return datetime.datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value}")
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
 
 
-# ✅ FIXED: CSV endpoint (previously broken)
 @app.get("/memory/csv")
-def get_csv():
-    csv_file = "backend/memory/complaints.csv"
-    if not os.path.exists(csv_file):
-        return Response("", media_type="text/csv")
+def get_csv(request: Request,
+            since: Optional[str] = None,
+            until: Optional[str] = None,
+            state: Optional[str] = None,
+            city: Optional[str] = None,
+            department: Optional[str] = None,
+            status: Optional[str] = None,
+            columns: Optional[str] = None):
+    selected = storage.CSV_COLUMNS
+    if columns:
+        selected = [c.strip() for c in columns.split(",") if c.strip()]
+        unknown = [c for c in selected if c not in storage.CSV_COLUMNS]
+        if unknown or not selected:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+
+    filters = {
+        "since": _date_bound(since, "since"),
+        "until": _date_bound(until, "until", end=True),
+        "state": state,
+        "city": city,
+        "department": department
+    }
+
+    view = lifecycle.get_view()
+    view.refresh()
+
+    # The export only changes when the store or a status does, so both
+    # positions (plus the query) identify it without reading any records.
+    etag = _etag(storage.STORE_LAYOUT, view.store_position, view.position,
+                 sorted(request.query_params.multi_items()))
+    headers = {"Content-Disposition": 'attachment; filename="complaints.csv"',
+               "Vary": "Accept-Encoding", "ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    def current(entries):
+        # stored status is the one a complaint was filed with
+        for entry in entries:
+            entry["status"] = view.get(entry.get("complaint_id")) or entry.get("status")
+            if status is None or entry["status"] == status:
+                yield entry
+
+    entries = storage.get_store().scan(set(selected) | {"complaint_id", "status"}, **filters)
+    chunks = storage.iter_csv(current(entries), selected)
+
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        chunks = gzip_chunks(chunks)
+
+    return StreamingResponse(chunks, media_type="text/csv", headers=headers)
+
+
+@app.post("/attachments")
+def upload_attachment(file: UploadFile = File(...)):
+    # limit_upload has already checked Content-Length; the blob writer caps
+    # the file itself. UploadFile spools to disk past 1 MB, so copying it
+    # over chunk by chunk keeps memory flat regardless of image size.
+    try:
+        return blobs.store_stream(file.file, file.filename)
+    except blobs.AttachmentTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+@app.get("/attachments/{blob_id}/thumbnail")
+def get_thumbnail(blob_id: str):
+    meta = blobs.get_meta(blob_id)
+    if meta is not None and meta.get("processed") is False:
+        raise HTTPException(status_code=404, detail="Thumbnail not ready yet",
+                            headers={"Retry-After": "2"})
+    if meta is None or not meta.get("thumbnail"):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+    path = blobs.thumb_path(blob_id)
+    return StreamingResponse(blobs.iter_range(blob_id, 0, os.path.getsize(path) - 1, path),
+                             media_type="image/jpeg",
+                             headers={"ETag": f'"{blob_id}-thumb"',
+                                      "Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@app.get("/attachments/{blob_id}")
+def get_attachment(blob_id: str, request: Request):
+    meta = blobs.get_meta(blob_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    etag = f'"{blob_id}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
 
-    with open(csv_file, "r", encoding="utf-8") as f:
-        return Response(f.read(), media_type="text/csv")
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = meta["size"]
+    start, end = 0, size - 1
+    status_code = 200
+
+    range_header = request.headers.get("range")
+    if range_header and range_header.startswith("bytes=") and "," not in range_header:
+        first, _, last = range_header[6:].partition("-")
+        try:
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(0, size - int(last))
+        except ValueError:
+            start, end = size, -1
+
+        if start > end or start >= size:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(blobs.iter_range(blob_id, start, end), status_code=status_code,
+                             media_type=meta.get("mime"), headers=headers)
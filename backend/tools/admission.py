@@ -0,0 +1,145 @@
+import math
+import os
+import threading
+import time
+
+from backend.tools import metrics
+
+# Complaints per minute and burst size per user and per (state, city); a
+# rate of 0 turns that limit off. Limits are per worker process. The user
+# limit is off by default: user_id is whatever the client sends (the UI
+# files everything as "user1"), so it only makes sense behind real auth.
+USER_RATE = float(os.environ.get("CIVICASSIST_USER_RATE", "0"))
+USER_BURST = float(os.environ.get("CIVICASSIST_USER_BURST", "5"))
+CITY_RATE = float(os.environ.get("CIVICASSIST_CITY_RATE", "1200"))
+CITY_BURST = float(os.environ.get("CIVICASSIST_CITY_BURST", "200"))
+
+# Intake requests handled at once; the rest get a 503 straight away.
+MAX_IN_FLIGHT = int(os.environ.get("CIVICASSIST_MAX_IN_FLIGHT", "64"))
+
+# "off", "on", or "auto": acknowledge complaints without waiting for the
+# write once intake is half full or the write queue backs up.
+DEGRADED_MODE = os.environ.get("CIVICASSIST_DEGRADED_MODE", "off")
+DEGRADE_BACKLOG = int(os.environ.get("CIVICASSIST_DEGRADE_BACKLOG", "256"))
+# Writes queued beyond this are refused rather than deferred.
+MAX_DEFERRED = int(os.environ.get("CIVICASSIST_MAX_DEFERRED", "10000"))
+
+INTAKE_PATHS = {"/agent/resolve", "/agent/resolve/batch"}
+
+# idle buckets are dropped once there are this many
+MAX_BUCKETS = 100000
+
+REJECTIONS = metrics.Counter("civicassist_admission_rejections_total",
+                             "Intake requests turned away.", ("reason",))
+DEFERRED = metrics.Counter("civicassist_deferred_writes_total",
+                           "Complaints acknowledged before they were written.")
+
+
+class TokenBuckets:
+    def __init__(self, rate_per_minute: float, burst: float):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._lock = threading.Lock()
+        # key -> [tokens, last refill]
+        self.buckets = {}
+
+    def take(self, key, now=None) -> float:
+        # 0 if a token was taken, otherwise seconds until one is available
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= MAX_BUCKETS:
+                    self._prune(now)
+                bucket = self.buckets[key] = [self.burst, now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            return (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        # a bucket that has refilled completely is the same as no bucket
+        full = (self.burst - 1) / self.rate
+        for key in [k for k, (_, last) in self.buckets.items() if now - last >= full]:
+            del self.buckets[key]
+
+
+class AdmissionController:
+    """Decides which intake requests to take on.
+
+    ``acquire``/``release`` bound the intake requests in progress, so a
+    burst is refused quickly instead of queueing behind slow writes while
+    reads starve. ``check`` applies the per-user and per-city token
+    buckets. ``degraded`` says when resolve should acknowledge a complaint
+    and leave its write to the group-commit queue.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, mode=DEGRADED_MODE):
+        self.max_in_flight = max_in_flight
+        self.mode = mode
+        self.users = TokenBuckets(USER_RATE, USER_BURST)
+        self.cities = TokenBuckets(CITY_RATE, CITY_BURST)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+                REJECTIONS.inc(reason="in_flight")
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def check(self, user_id, state=None, city=None) -> float:
+        # Seconds the caller should wait, 0 if admitted.
+        wait = self.users.take(user_id)
+        if wait:
+            REJECTIONS.inc(reason="user_rate")
+            return wait
+        if city:
+            wait = self.cities.take((state, city))
+            if wait:
+                # the user's token is spent anyway; retrying is what costs
+                REJECTIONS.inc(reason="city_rate")
+                return wait
+        return 0.0
+
+    def degraded(self, backlog: int) -> bool:
+        if self.mode == "on":
+            return True
+        if self.mode != "auto":
+            return False
+        busy = self.max_in_flight > 0 and self.in_flight * 2 >= self.max_in_flight
+        return busy or backlog >= DEGRADE_BACKLOG
+
+
+def retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
+
+
+@metrics.collector
+def in_flight_samples():
+    return [("civicassist_intake_in_flight", "gauge", "Intake requests in progress.",
+             [({}, _controller.in_flight if _controller is not None else 0)])]
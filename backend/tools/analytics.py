@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+
+from backend.tools import lifecycle, storage
+
+snapshot_file = os.path.join(storage.MEMORY_DIR, "analytics.json")
+
+DIMENSIONS = ["department", "state", "city", "status", "issue_type", "has_attachment"]
+# the record fields the counters read
+COLUMNS = ["timestamp", "department", "state", "city", "status", "issue_type", "attachments"]
+
+# Persist the counters after this many new records.
+SNAPSHOT_EVERY = 100
+
+
+def dimension_value(entry: dict, dimension: str) -> str:
+    if dimension == "has_attachment":
+        return "true" if entry.get("attachments") else "false"
+    return storage.entry_field(entry, dimension) or "Unknown"
+
+
+class Analytics:
+    """Per-day counters per dimension, kept current from the store's tail."""
+
+    def __init__(self, path=snapshot_file):
+        self.path = path
+        self._lock = threading.Lock()
+        self.position = 0
+        self.totals = {d: {} for d in DIMENSIONS}
+        self.total = 0
+        self.daily = {}
+        self._pending = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        # positions are byte offsets for the log, seq numbers for SQLite and
+        # per-shard dicts of either when sharded
+        if snap.get("store") != storage.STORE_LAYOUT:
+            return
+
+        self.position = snap["position"]
+        self.total = snap["total"]
+        self.totals = snap["totals"]
+        self.daily = snap["daily"]
+
+    def _save(self):
+        snap = {
+            "store": storage.STORE_LAYOUT,
+            "position": self.position,
+            "total": self.total,
+            "totals": self.totals,
+            "daily": self.daily
+        }
+        tmp = self.path + f".{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snap, f)
+        os.replace(tmp, self.path)
+        self._pending = 0
+
+    def _bump(self, day: str, dimension: str, value: str, delta: int):
+        totals = self.totals.setdefault(dimension, {})
+        totals[value] = totals.get(value, 0) + delta
+
+        bucket = self.daily.setdefault(day, {"total": 0}).setdefault(dimension, {})
+        bucket[value] = bucket.get(value, 0) + delta
+
+    def _count(self, entry: dict):
+        day = (entry.get("timestamp") or "")[:10] or "unknown"
+        self.total += 1
+        self.daily.setdefault(day, {"total": 0})["total"] += 1
+        for d in DIMENSIONS:
+            self._bump(day, d, dimension_value(entry, d), 1)
+
+    def _seed(self, store):
+        # First build over a SQLite store: GROUP BY in the database instead
+        # of decoding every record.
+        rows, self.position = store.daily_counts(DIMENSIONS)
+        for day, dimension, value, n in rows:
+            self._bump(day, dimension, value, n)
+            if dimension == DIMENSIONS[0]:
+                self.total += n
+                self.daily[day]["total"] += n
+        self._pending += 1
+
+    def refresh(self, store=None):
+        store = store or storage.get_store()
+        with self._lock:
+            if not self.position and not self.total and hasattr(store, "daily_counts"):
+                self._seed(store)
+            for entry, position in store.tail(self.position, COLUMNS):
+                self._count(entry)
+                self.position = position
+                self._pending += 1
+
+            if self._pending >= SNAPSHOT_EVERY:
+                self._save()
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._save()
+
+    def summary(self, since=None, until=None) -> dict:
+        self.refresh()
+
+        with self._lock:
+            if since is None and until is None:
+                total = self.total
+                by = {d: dict(self.totals.get(d, {})) for d in DIMENSIONS}
+            else:
+                total = 0
+                by = {d: {} for d in DIMENSIONS}
+                for day, bucket in self.daily.items():
+                    if (since and day < since) or (until and day > until):
+                        continue
+                    total += bucket["total"]
+                    for d in DIMENSIONS:
+                        for value, n in bucket.get(d, {}).items():
+                            by[d][value] = by[d].get(value, 0) + n
+
+        # records keep the status they were filed with; the lifecycle view
+        # knows where each one is now
+        view = lifecycle.get_view()
+        view.refresh()
+        by["status"] = view.summary(since, until)["by_status"]
+
+        return {"total": total, "by": by}
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_analytics() -> Analytics:
+    global _analytics
+    if _analytics is None:
+        with _analytics_lock:
+            if _analytics is None:
+                _analytics = Analytics()
+    return _analytics
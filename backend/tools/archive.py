@@ -0,0 +1,267 @@
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+import urllib.parse
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # the archive tier is optional
+    pa = None
+
+from backend.tools import storage
+
+logger = logging.getLogger(__name__)
+
+# Complaints older than this move out of the hot log.
+ARCHIVE_AGE_DAYS = float(os.environ.get("CIVICASSIST_ARCHIVE_AGE_DAYS", "180"))
+# Seconds between background compactions; 0 leaves it to the CLI.
+ARCHIVE_INTERVAL = float(os.environ.get("CIVICASSIST_ARCHIVE_INTERVAL", "0"))
+# Records per compaction run (one set of part files).
+RUN_SIZE = 100000
+
+# One typed column per CSV field; exports and aggregates read only these.
+FIELDS = list(storage.CSV_COLUMNS)
+FILTER_FIELDS = set(FIELDS) - {"attachments"}
+# Top-level string fields kept only in their column; everything else about
+# a record goes into the "extra" JSON column, so nothing is stored twice.
+DIRECT = ["complaint_id", "user_id", "complaint_text", "status", "state", "city", "timestamp"]
+
+_PART = re.compile(r"^part-(\d+)-(\d+)\.parquet$")
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _schema():
+    return pa.schema([(f, pa.string()) for f in FIELDS]
+                     + [("extra", pa.string()), ("_offset", pa.int64()), ("_end", pa.int64())])
+
+
+def _projection(columns) -> list:
+    # columns to read for entries carrying at least `columns`
+    if columns is None or not set(columns) <= set(FIELDS):
+        return FIELDS + ["extra"]
+    return list(columns)
+
+
+def _entries(table, names):
+    # Entries rebuilt from the typed columns (plus "extra" for whole
+    # records); storage.entry_field reads the same values back out.
+    for values in zip(*(table.column(n).to_pylist() for n in names)):
+        row = dict(zip(names, values))
+        extra = row.pop("extra", None)
+        entry = json.loads(extra) if extra else {}
+        for name, value in row.items():
+            if value is None:
+                continue
+            if name == "issue_type":
+                entry.setdefault("classification", {"issue_type": value})
+            elif name == "department":
+                entry.setdefault("department", {"name": value})
+            elif name == "attachments":
+                if value:
+                    entry.setdefault("attachments", value.split(","))
+            else:
+                entry[name] = value
+        yield entry
+
+
+def _quote(value) -> str:
+    return urllib.parse.quote(str(value or "unknown"), safe="")
+
+
+class Archive:
+    """Parquet tier under ``root/month=YYYY-MM/state=<state>/``.
+
+    Each compaction run writes ``part-<start>-<end>.parquet`` files, named
+    after the range of log offsets they cover, so a rerun after a crash
+    overwrites rather than duplicates. Rows keep their log offsets
+    (``_offset``/``_end``), which lets ``tail`` and history treat archived
+    records as the start of the same log. Filters on month and state pick
+    the directories to open; the rest are pushed down to the row groups.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def runs(self, since=None, until=None, state=None) -> list:
+        # [(start, end, [paths])] in log order, pruned by directory names.
+        if pa is None or not os.path.isdir(self.root):
+            return []
+
+        state_dir = f"state={_quote(state)}" if state is not None else None
+        runs = {}
+        for month_dir in os.listdir(self.root):
+            if not month_dir.startswith("month="):
+                continue
+            month = month_dir[6:]
+            if (since and month < since[:7]) or (until and month > until[:7]):
+                continue
+            for sdir in os.listdir(os.path.join(self.root, month_dir)):
+                if state_dir is not None and sdir != state_dir:
+                    continue
+                directory = os.path.join(self.root, month_dir, sdir)
+                for name in os.listdir(directory):
+                    m = _PART.match(name)
+                    if m:
+                        key = (int(m.group(1)), int(m.group(2)))
+                        runs.setdefault(key, []).append(os.path.join(directory, name))
+        return [(start, end, paths) for (start, end), paths in sorted(runs.items())]
+
+    def write(self, rows):
+        # rows: [(entry, offset, end)] in log order, all from one run
+        if not rows:
+            return
+        start, end = rows[0][1], rows[-1][2]
+        partitions = {}
+        for entry, offset, stop in rows:
+            month = (entry.get("timestamp") or "")[:7] or "unknown"
+            key = (month, entry.get("state"))
+            partitions.setdefault(key, []).append((entry, offset, stop))
+
+        schema = _schema()
+        for (month, state), part in partitions.items():
+            directory = os.path.join(self.root, f"month={_quote(month)}", f"state={_quote(state)}")
+            os.makedirs(directory, exist_ok=True)
+            columns = {f: [] for f in schema.names}
+            for entry, offset, stop in part:
+                for f in FIELDS:
+                    value = storage.entry_field(entry, f)
+                    columns[f].append(None if value is None else str(value))
+                columns["extra"].append(json.dumps(
+                    {k: v for k, v in entry.items() if not (k in DIRECT and isinstance(v, str))}))
+                columns["_offset"].append(offset)
+                columns["_end"].append(stop)
+
+            path = os.path.join(directory, f"part-{start}-{end}.parquet")
+            tmp = path + ".tmp"
+            pq.write_table(pa.table(columns, schema=schema), tmp, compression="zstd",
+                           row_group_size=16384)
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+
+    def _table(self, paths, columns, expression):
+        return ds.dataset(paths, format="parquet").to_table(columns=columns, filter=expression)
+
+    def _expression(self, filters, position=None, before=None):
+        expression = None
+
+        def both(a, b):
+            return b if a is None else a & b
+
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name == "since":
+                expression = both(expression, ds.field("timestamp") >= value)
+            elif name == "until":
+                expression = both(expression, ds.field("timestamp") < value)
+            elif name in FILTER_FIELDS:
+                expression = both(expression, ds.field(name) == value)
+            else:
+                raise ValueError(f"Unknown filter: {name}")
+        if position is not None:
+            expression = both(expression, ds.field("_offset") >= position)
+        if before is not None:
+            expression = both(expression, ds.field("_offset") < before)
+        return expression
+
+    def scan(self, columns=None, **filters):
+        names = _projection(columns)
+        expression = self._expression(filters)
+        for _, _, paths in self.runs(filters.get("since"), filters.get("until"), filters.get("state")):
+            table = self._table(paths, names + ["_offset"], expression).sort_by("_offset")
+            yield from _entries(table, names)
+
+    def tail(self, position=0, before=None, columns=None):
+        # Archived (entry, end offset) pairs from `position` on, in log order.
+        names = _projection(columns)
+        for start, end, paths in self.runs():
+            if end <= position or (before is not None and start >= before):
+                continue
+            table = self._table(paths, names + ["_offset", "_end"],
+                                self._expression({}, position, before)).sort_by("_offset")
+            yield from zip(_entries(table, names), table.column("_end").to_pylist())
+
+    def fetch(self, offsets) -> dict:
+        # {offset: entry} for records at these log offsets.
+        wanted = sorted(set(offsets))
+        if not wanted:
+            return {}
+        names = _projection(None)
+        found = {}
+        for start, end, paths in self.runs():
+            inside = [o for o in wanted if start <= o < end]
+            if not inside:
+                continue
+            table = self._table(paths, names + ["_offset"],
+                                ds.field("_offset").isin(pa.array(inside, pa.int64())))
+            found.update(zip(table.column("_offset").to_pylist(), _entries(table, names)))
+        return found
+
+    def refs(self, position=0):
+        # (user_id, offset, length) for archived records from `position` on.
+        for start, end, paths in self.runs():
+            if end <= position:
+                continue
+            table = self._table(paths, ["user_id", "_offset", "_end"],
+                                ds.field("_offset") >= position).sort_by("_offset")
+            for user_id, offset, stop in zip(table.column("user_id").to_pylist(),
+                                             table.column("_offset").to_pylist(),
+                                             table.column("_end").to_pylist()):
+                yield user_id, offset, stop - offset
+
+
+def cutoff(age_days=None) -> str:
+    age = ARCHIVE_AGE_DAYS if age_days is None else age_days
+    return (datetime.datetime.utcnow() - datetime.timedelta(days=age)).isoformat()
+
+
+def compact(age_days=None) -> int:
+    if pa is None:
+        raise RuntimeError("pyarrow is required for archiving")
+    return storage.compact_store(cutoff(age_days))
+
+
+def start_compactor(interval=ARCHIVE_INTERVAL):
+    if interval <= 0:
+        return None
+    if pa is None:
+        logger.warning("CIVICASSIST_ARCHIVE_INTERVAL is set but pyarrow is not installed")
+        return None
+
+    def run():
+        while True:
+            try:
+                moved = compact()
+                if moved:
+                    logger.info("Archived %d complaints", moved)
+            except Exception:
+                logger.exception("Archive compaction failed")
+            stop.wait(interval)
+            if stop.is_set():
+                return
+
+    stop = threading.Event()
+    threading.Thread(target=run, name="archive-compactor", daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move old complaints to the Parquet archive")
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("--age-days", type=float, default=None)
+    args = parser.parse_args()
+
+    moved = compact(args.age_days)
+    storage.close_store()
+    print(json.dumps({"archived": moved}))
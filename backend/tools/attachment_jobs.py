@@ -0,0 +1,194 @@
+import datetime
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import (BrokenExecutor, CancelledError, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+
+try:
+    from PIL import ExifTags, Image
+except ImportError:  # thumbnails and EXIF are optional
+    Image = None
+
+try:
+    import pytesseract
+except ImportError:  # OCR is optional
+    pytesseract = None
+
+from backend.tools import blobs, metrics
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for image jobs; 0 runs them on one background thread.
+WORKERS = int(os.environ.get("CIVICASSIST_ATTACHMENT_WORKERS", "2"))
+OCR_ENABLED = os.environ.get("CIVICASSIST_OCR", "") == "1"
+OCR_MAX_CHARS = 4000
+
+JOB_SECONDS = metrics.Histogram("civicassist_attachment_job_seconds",
+                                "Attachment job latency, from submission to metadata written.",
+                                ("outcome",), buckets=metrics.LATENCY_BUCKETS + (30.0, 60.0))
+
+_GPS_IFD = 0x8825
+_EXIF_IFD = 0x8769
+
+
+def _degrees(value, ref):
+    d, m, s = (float(x) for x in value)
+    degrees = d + m / 60 + s / 3600
+    return round(-degrees if ref in ("S", "W") else degrees, 6)
+
+
+def _exif(im) -> dict:
+    exif = im.getexif()
+    found = {}
+
+    gps = exif.get_ifd(_GPS_IFD)
+    try:
+        if 2 in gps and 4 in gps:
+            found["gps"] = {"lat": _degrees(gps[2], gps.get(1)), "lon": _degrees(gps[4], gps.get(3))}
+    except (TypeError, ValueError, ZeroDivisionError):
+        pass
+
+    taken = exif.get_ifd(_EXIF_IFD).get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime)
+    if isinstance(taken, str):
+        try:
+            found["taken_at"] = datetime.datetime.strptime(taken.strip("\x00 "), "%Y:%m:%d %H:%M:%S").isoformat()
+        except ValueError:
+            pass
+    return found
+
+
+def process(blob_id: str, ocr=OCR_ENABLED) -> dict:
+    # Runs in a worker process: everything CPU-heavy about an image.
+    result = {"thumbnail": blobs.make_thumbnail(blob_id)}
+    if Image is None:
+        return result
+
+    try:
+        with Image.open(blobs.blob_path(blob_id)) as im:
+            result.update(_exif(im))
+            if ocr and pytesseract is not None:
+                text = pytesseract.image_to_string(im).strip()
+                result["ocr_text"] = text[:OCR_MAX_CHARS] or None
+    except (OSError, ValueError, Image.DecompressionBombError):
+        pass
+    except Exception as e:  # tesseract missing or failing
+        result["ocr_error"] = str(e)
+    return result
+
+
+class AttachmentJobs:
+    """Background queue for image attachments.
+
+    Uploads return as soon as the blob is stored; thumbnails, EXIF GPS and
+    capture time, and (with CIVICASSIST_OCR=1) OCR text are produced in a
+    process pool and merged into the blob's ``.json`` sidecar, where
+    complaint reads pick them up. Jobs are keyed by blob id, so the same
+    image is never processed twice at once.
+    """
+
+    def __init__(self, workers=WORKERS):
+        if workers > 0:
+            # spawn: forking a threaded server can copy held locks
+            self.pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.pool = ThreadPoolExecutor(1, thread_name_prefix="attachment-jobs")
+        self._lock = threading.Lock()
+        self.pending = {}
+
+    def submit(self, blob_id: str):
+        with self._lock:
+            future = self.pending.get(blob_id)
+            if future is None:
+                future = self.pool.submit(process, blob_id)
+                self.pending[blob_id] = future
+                started = time.perf_counter()
+                future.add_done_callback(lambda f: self._done(blob_id, f, started))
+        return future
+
+    def _done(self, blob_id, future, started):
+        outcome = "ok"
+        try:
+            result = future.result()
+        except (CancelledError, BrokenExecutor):
+            # shut down or lost with its worker, not a bad image: left
+            # unprocessed so resume() picks it up again
+            logger.warning("Attachment job for %s did not run", blob_id)
+            result, outcome = None, "cancelled"
+        except Exception:
+            logger.exception("Attachment job for %s failed", blob_id)
+            result, outcome = {"thumbnail": False}, "error"
+
+        meta = blobs.get_meta(blob_id)
+        if meta is not None and result is not None:
+            meta.update(result, processed=True)
+            blobs.write_meta(meta)
+        with self._lock:
+            self.pending.pop(blob_id, None)
+        JOB_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+
+    def depth(self) -> int:
+        return len(self.pending)
+
+    def close(self, wait=True):
+        self.pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+def get_jobs() -> AttachmentJobs:
+    global _jobs
+    if _jobs is None:
+        with _jobs_lock:
+            if _jobs is None:
+                _jobs = AttachmentJobs()
+    return _jobs
+
+
+def close_jobs(wait=True):
+    global _jobs
+    if _jobs is not None:
+        _jobs.close(wait)
+        _jobs = None
+
+
+def resume() -> int:
+    # Requeues images whose job never finished, e.g. cut short by a restart.
+    n = 0
+    for blob_id in blobs.unprocessed():
+        try:
+            get_jobs().submit(blob_id)
+        except RuntimeError:  # shutting down
+            break
+        n += 1
+    if n:
+        logger.info("Requeued %d unprocessed attachments", n)
+    return n
+
+
+def start_resume():
+    threading.Thread(target=resume, name="attachment-resume", daemon=True).start()
+
+
+def enrich(attachments) -> list:
+    # Stored records keep the metadata from upload time; fill in what the
+    # jobs have produced since.
+    out = []
+    for a in attachments or []:
+        if isinstance(a, dict) and a.get("processed") is False:
+            meta = blobs.get_meta(a.get("id"))
+            if meta is not None:
+                a = dict(meta, filename=a.get("filename") or meta.get("filename"))
+        out.append(a)
+    return out
+
+
+@metrics.collector
+def queue_samples():
+    return [("civicassist_attachment_jobs_queued", "gauge",
+             "Attachment jobs submitted and not yet finished.",
+             [({}, _jobs.depth() if _jobs is not None else 0)])]
@@ -0,0 +1,239 @@
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import os
+import re
+import uuid
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are optional
+    Image = None
+
+from backend.tools import metrics
+from backend.tools.storage import MEMORY_DIR
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = os.path.join(MEMORY_DIR, "blobs")
+CHUNK_SIZE = 64 * 1024
+MAX_ATTACHMENT_BYTES = int(os.environ.get("CIVICASSIST_MAX_ATTACHMENT_BYTES", str(10 * 1024 * 1024)))
+THUMB_SIZE = (256, 256)
+
+BLOB_ID = re.compile(r"^[0-9a-f]{64}$")
+
+MAGIC = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def sniff_mime(head: bytes) -> str:
+    for magic, mime in MAGIC:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class AttachmentTooLarge(ValueError):
+    pass
+
+
+def blob_path(blob_id: str) -> str:
+    return os.path.join(BLOB_DIR, blob_id[:2], blob_id)
+
+
+def thumb_path(blob_id: str) -> str:
+    return blob_path(blob_id) + ".thumb.jpg"
+
+
+def is_blob_id(value) -> bool:
+    return isinstance(value, str) and bool(BLOB_ID.match(value))
+
+
+def get_meta(blob_id: str):
+    if not is_blob_id(blob_id):
+        return None
+    try:
+        with open(blob_path(blob_id) + ".json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except OSError:
+        return None
+
+
+def write_meta(meta: dict):
+    path = blob_path(meta["id"]) + ".json"
+    tmp = path + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def make_thumbnail(blob_id: str) -> bool:
+    if Image is None:
+        return False
+
+    try:
+        with Image.open(blob_path(blob_id)) as im:
+            # JPEG draft mode decodes at reduced scale, so memory tracks the
+            # thumbnail size rather than the original resolution.
+            im.draft("RGB", THUMB_SIZE)
+            im.thumbnail(THUMB_SIZE)
+            im.convert("RGB").save(thumb_path(blob_id), "JPEG", quality=80)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return False
+    return True
+
+
+class BlobWriter:
+    # Writes a blob chunk by chunk, hashing as it goes, and only moves it to
+    # its content address once complete.
+
+    def __init__(self, filename=None, max_bytes=MAX_ATTACHMENT_BYTES):
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._head = b""
+        self._hash = hashlib.sha256()
+        self._tmp = os.path.join(BLOB_DIR, f"upload-{uuid.uuid4().hex}.tmp")
+        self._f = open(self._tmp, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise AttachmentTooLarge(f"Attachment exceeds {self.max_bytes} bytes")
+
+        if len(self._head) < 16:
+            self._head += chunk[:16]
+        self._hash.update(chunk)
+        self._f.write(chunk)
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def commit(self) -> dict:
+        self._f.close()
+        blob_id = self._hash.hexdigest()
+
+        meta = get_meta(blob_id)
+        if meta is not None:
+            os.remove(self._tmp)
+            if meta.get("processed") is False:
+                # its job may have died with a previous process
+                _submit_job(blob_id)
+            return dict(meta, filename=self.filename or meta.get("filename"))
+
+        path = blob_path(blob_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self._tmp, path)
+        metrics.ATTACHMENT_BYTES.observe(self.size)
+
+        meta = {"id": blob_id, "size": self.size, "mime": sniff_mime(self._head),
+                "filename": self.filename}
+        if meta["mime"].startswith("image/"):
+            # thumbnail, EXIF and OCR are filled in by attachment_jobs
+            meta.update(thumbnail=False, processed=False)
+        write_meta(meta)
+        if meta["mime"].startswith("image/"):
+            _submit_job(blob_id)
+        return meta
+
+
+def unprocessed():
+    # Blob ids whose sidecar still says processed=false.
+    if not os.path.isdir(BLOB_DIR):
+        return
+    for prefix in os.listdir(BLOB_DIR):
+        directory = os.path.join(BLOB_DIR, prefix)
+        if len(prefix) != 2 or not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            if name.endswith(".json") and is_blob_id(name[:-5]):
+                meta = get_meta(name[:-5])
+                if meta is not None and meta.get("processed") is False:
+                    yield meta["id"]
+
+
+def _submit_job(blob_id: str):
+    # The blob is already safe; a job that cannot start is retried the next
+    # time the same content is uploaded.
+    from backend.tools import attachment_jobs
+    try:
+        attachment_jobs.get_jobs().submit(blob_id)
+    except Exception:
+        logger.exception("Could not queue processing for attachment %s", blob_id)
+
+
+def put_bytes(data: bytes, filename=None) -> dict:
+    writer = BlobWriter(filename, max_bytes=None)
+    for i in range(0, len(data), CHUNK_SIZE):
+        writer.write(data[i:i + CHUNK_SIZE])
+    return writer.commit()
+
+
+def store_stream(stream, filename=None, max_bytes=MAX_ATTACHMENT_BYTES) -> dict:
+    writer = BlobWriter(filename, max_bytes)
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.commit()
+
+
+def ingest_attachment(attachment):
+    # Accepts what clients have historically sent: a bare base64 string,
+    # {"filename", "content"} with base64 content, or a reference to an
+    # already stored blob / legacy upload path.
+    if isinstance(attachment, dict):
+        if "id" in attachment and get_meta(attachment["id"]):
+            return get_meta(attachment["id"])
+        filename, content = attachment.get("filename"), attachment.get("content")
+    else:
+        filename, content = None, attachment
+
+    if not isinstance(content, str):
+        return {"filename": filename}
+
+    if is_blob_id(content) and get_meta(content):
+        return get_meta(content)
+
+    try:
+        data = base64.b64decode(content, validate=True)
+    except (binascii.Error, ValueError):
+        # legacy path or filename reference, nothing to decode
+        return {"filename": filename or content}
+
+    return put_bytes(data, filename)
+
+
+def externalize(entry: dict) -> dict:
+    attachments = entry.get("attachments")
+    if attachments:
+        entry = dict(entry, attachments=[ingest_attachment(a) for a in attachments])
+    return entry
+
+
+def iter_range(blob_id: str, start: int, end: int, path=None):
+    with open(path or blob_path(blob_id), "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
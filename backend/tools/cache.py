@@ -0,0 +1,88 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.environ.get("CIVICASSIST_CACHE_SIZE", "10000"))
+CACHE_TTL = float(os.environ.get("CIVICASSIST_CACHE_TTL", "600"))
+# Seconds within which a repeat submission from the same user collapses into
+# the earlier complaint. 0 disables it.
+DEDUP_WINDOW = float(os.environ.get("CIVICASSIST_DEDUP_WINDOW", "0"))
+# Estimated Jaccard similarity of the texts (incident MinHash signatures)
+# at which a submission counts as a repeat.
+DEDUP_SIMILARITY = float(os.environ.get("CIVICASSIST_DEDUP_SIMILARITY", "0.8"))
+# Recent submissions remembered per (user, state, city).
+DEDUP_PER_KEY = 20
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+class TTLCache:
+    """Bounded LRU with per-entry expiry."""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, value = item
+            if expires < now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+# (normalized text, state, city) -> (classification, department, action_plan)
+pipeline_cache = TTLCache()
+
+# (user_id, state, city) -> [(time, text signature, response)]; per process
+dedup_cache = TTLCache(maxsize=CACHE_SIZE, ttl=DEDUP_WINDOW)
+
+
+def pipeline_key(text, state, city):
+    return normalize(text), state, city
+
+
+def dedup_key(user_id, state, city):
+    return user_id, state, city
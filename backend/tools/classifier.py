@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "keyword" (default) or "ml"; both expose classify() and classify_batch().
+BACKEND = os.environ.get("CIVICASSIST_CLASSIFIER", "keyword")
+
+CONFIG_FILE = os.environ.get(
+    "CIVICASSIST_CLASSIFIER_CONFIG",
+    os.path.join(os.path.dirname(__file__), "..", "config", "classifier.json")
+)
+
+
+class KeywordClassifier:
+    """All category keywords compiled into one alternation, matched in a single pass."""
+
+    def __init__(self, config: dict):
+        self.categories = config["categories"]
+        self.default = config["default"]
+        self.labels = {c["issue_type"]: c["issue_type"] for c in self.categories}
+        for c in self.categories:
+            for label in c.get("labels", []):
+                self.labels[label] = c["issue_type"]
+
+        # keyword -> [(category index, weight)]; longer phrases are more specific
+        self.keywords = {}
+        for i, c in enumerate(self.categories):
+            for k in c["keywords"]:
+                self.keywords.setdefault(k.lower(), []).append((i, len(k.split())))
+
+        # Longest first so "streetlight" wins over "street" at the same position.
+        ordered = sorted(self.keywords, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(k) for k in ordered))
+
+        # keyword x category weight matrix for the vectorized batch path
+        self.keyword_ids = {k: j for j, k in enumerate(ordered)}
+        self.weights = np.zeros((len(ordered), len(self.categories)))
+        for k, j in self.keyword_ids.items():
+            for i, weight in self.keywords[k]:
+                self.weights[j, i] += weight
+        self.ceilings = np.array([c["confidence"] for c in self.categories])
+
+    def match(self, text: str):
+        scores = [0] * len(self.categories)
+        highlights = []
+        for m in self.pattern.finditer(text.lower()):
+            keyword = m.group(0)
+            for i, weight in self.keywords[keyword]:
+                scores[i] += weight
+            if keyword not in highlights:
+                highlights.append(keyword)
+        return scores, highlights
+
+    def result(self, scores, highlights) -> dict:
+        total = sum(scores)
+        if not total:
+            return {"issue_type": self.default["issue_type"],
+                    "confidence": self.default["confidence"],
+                    "highlights": [], "scores": {}}
+
+        # ties go to the category listed first in the config
+        best = max(range(len(scores)), key=lambda i: (scores[i], -i))
+        category = self.categories[best]
+        return {
+            "issue_type": category["issue_type"],
+            "confidence": round(category["confidence"] * scores[best] / total, 2),
+            "highlights": highlights,
+            "scores": {self.categories[i]["issue_type"]: s for i, s in enumerate(scores) if s}
+        }
+
+    def classify(self, text: str) -> dict:
+        return self.result(*self.match(text))
+
+    def classify_batch(self, texts) -> list:
+        n, k = len(texts), len(self.keyword_ids)
+        rows, cols, highlights = [], [], []
+        for r, text in enumerate(texts):
+            seen = []
+            for m in self.pattern.finditer(text.lower()):
+                keyword = m.group(0)
+                rows.append(r)
+                cols.append(self.keyword_ids[keyword])
+                if keyword not in seen:
+                    seen.append(keyword)
+            highlights.append(seen)
+
+        # sparse (row, keyword) hits -> count matrix -> category scores
+        flat = np.asarray(rows, dtype=np.int64) * k + np.asarray(cols, dtype=np.int64)
+        counts = np.bincount(flat, minlength=n * k).reshape(n, k)
+        scores = counts @ self.weights
+
+        totals = scores.sum(axis=1)
+        best = scores.argmax(axis=1)  # first max, i.e. config order on ties
+        top = scores[np.arange(n), best]
+        confidence = self.ceilings[best] * top / np.where(totals > 0, totals, 1)
+
+        results = []
+        for r in range(n):
+            if not totals[r]:
+                results.append({"issue_type": self.default["issue_type"],
+                                "confidence": self.default["confidence"],
+                                "highlights": [], "scores": {}})
+                continue
+            results.append({
+                "issue_type": self.categories[best[r]]["issue_type"],
+                "confidence": round(float(confidence[r]), 2),
+                "highlights": highlights[r],
+                "scores": {self.categories[i]["issue_type"]: int(s)
+                           for i, s in enumerate(scores[r]) if s}
+            })
+        return results
+
+
+def load_classifier(path=CONFIG_FILE) -> KeywordClassifier:
+    with open(path, "r", encoding="utf-8") as f:
+        return KeywordClassifier(json.load(f))
+
+
+_classifier = None
+_keyword_classifier = None
+_classifier_lock = threading.RLock()
+
+
+def get_keyword_classifier() -> KeywordClassifier:
+    # The heuristic fallback, whichever backend is primary.
+    global _keyword_classifier
+    if _keyword_classifier is None:
+        with _classifier_lock:
+            if _keyword_classifier is None:
+                _keyword_classifier = load_classifier()
+    return _keyword_classifier
+
+
+def get_classifier():
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = _load_backend()
+    return _classifier
+
+
+def _load_backend():
+    if BACKEND == "ml":
+        from backend.tools import ml_classifier
+        try:
+            return ml_classifier.LinearClassifier(ml_classifier.load_model())
+        except OSError:
+            logger.warning("No trained model in %s, using keyword classifier",
+                           ml_classifier.MODEL_DIR)
+    return get_keyword_classifier()
@@ -1,30 +1,123 @@
 import json
+import logging
+import os
+import threading
+import time
 
-def map_department(issue_type: str):
-    dept_mapping = {
-        "Water supply": {
-            "name": "Water Board",
-            "contact": {"portal": "https://water.gov", "phone": "0801234567"},
-            "confidence": 0.90,
-            "justification": "Water issues are handled by Water Board."
-        },
-        "Electricity": {
-            "name": "Electricity Board",
-            "contact": {"portal": "https://electricity.gov", "phone": "0809876543"},
-            "confidence": 0.90,
-            "justification": "Power issues fall under the Electricity Board."
-        },
-        "Garbage/Waste": {
-            "name": "Municipal Corporation",
-            "contact": {"portal": "https://municipal.gov", "phone": "0803456789"},
-            "confidence": 0.88,
-            "justification": "Garbage issues are handled by the municipality."
-        }
-    }
-
-    return dept_mapping.get(issue_type, {
-        "name": "Unknown",
-        "contact": {},
-        "confidence": 0.0,
-        "justification": "No mapping found."
-    })
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = os.environ.get(
+    "CIVICASSIST_DEPARTMENTS_CONFIG",
+    os.path.join(os.path.dirname(__file__), "..", "config", "departments.json")
+)
+
+# How often lookups check the config file for changes.
+RELOAD_INTERVAL = 2.0
+
+
+def _merge(base: dict, override: dict) -> dict:
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class DepartmentRegistry:
+    """(issue_type, state, city) -> (department, plan), resolved once at load.
+
+    The returned dicts are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, config: dict):
+        self.aliases = config.get("aliases", {})
+        default = (config["default"]["department"], config["default"]["plan"])
+        base = {it: (v["department"], v["plan"]) for it, v in config["issue_types"].items()}
+
+        rules = {}
+        for rule in config.get("overrides", []):
+            key = (rule["issue_type"], rule.get("state"), rule.get("city"))
+            rules[key] = rule
+
+        def resolve(issue_type, state, city):
+            dept, plan = base.get(issue_type, default)
+            # most specific rule applied last
+            for key in [(issue_type, state, None), (issue_type, state, city)]:
+                rule = rules.get(key)
+                if rule and key[1] is not None:
+                    dept = _merge(dept, rule.get("department", {}))
+                    plan = _merge(plan, rule.get("plan", {}))
+            return dept, plan
+
+        self.default = default
+        self.table = {}
+        for issue_type in base:
+            self.table[(issue_type, None, None)] = base[issue_type]
+            for state, cities in config.get("locations", {}).items():
+                self.table[(issue_type, state, None)] = resolve(issue_type, state, None)
+                for city in cities:
+                    self.table[(issue_type, state, city)] = resolve(issue_type, state, city)
+
+        # overrides for places not listed under locations
+        for issue_type, state, city in rules:
+            self.table.setdefault((issue_type, state, city), resolve(issue_type, state, city))
+
+    def lookup(self, issue_type, state=None, city=None):
+        issue_type = self.aliases.get(issue_type, issue_type)
+        table = self.table
+        return (table.get((issue_type, state, city))
+                or table.get((issue_type, state, None))
+                or table.get((issue_type, None, None))
+                or self.default)
+
+
+class _Loader:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._registry = None
+        self._mtime = None
+        self._checked = 0.0
+
+    def get(self) -> DepartmentRegistry:
+        now = time.monotonic()
+        if self._registry is not None and now - self._checked < RELOAD_INTERVAL:
+            return self._registry
+
+        with self._lock:
+            self._checked = now
+            mtime = None
+            try:
+                mtime = os.path.getmtime(self.path)
+                if self._registry is not None and mtime == self._mtime:
+                    return self._registry
+                with open(self.path, "r", encoding="utf-8") as f:
+                    registry = DepartmentRegistry(json.load(f))
+            except Exception:
+                # anything from a half-written file to a rule of the wrong type
+                if self._registry is None:
+                    raise
+                logger.exception("Could not reload the department config, keeping the previous one")
+                if mtime is not None:
+                    self._mtime = mtime
+                return self._registry
+            # swap in one assignment; in-flight lookups keep the old table
+            self._registry, self._mtime = registry, mtime
+        return self._registry
+
+
+_loader = _Loader(CONFIG_FILE)
+
+
+def get_registry() -> DepartmentRegistry:
+    return _loader.get()
+
+
+def map_department(issue_type: str, state=None, city=None):
+    return get_registry().lookup(issue_type, state, city)[0]
+
+
+def plan_for(issue_type: str, state=None, city=None):
+    return get_registry().lookup(issue_type, state, city)[1]
@@ -0,0 +1,239 @@
+import datetime
+import functools
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from backend.tools import lifecycle, metrics, storage
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+escalations_file = os.path.join(storage.MEMORY_DIR, "escalations.jsonl")
+
+# Seconds between scheduler wake-ups; 0 leaves firing to the API calls.
+TICK = float(os.environ.get("CIVICASSIST_ESCALATION_TICK", "60"))
+# Escalations written per locked append.
+FIRE_BATCH = 1000
+DEFAULT_HOURS = 72
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)\s*\+?\s*(hours?|hrs?|h\b|days?)", re.I)
+_ESCALATION_STEP = re.compile(r"escalat|follow up|follow-up", re.I)
+
+FIRED = metrics.Counter("civicassist_escalations_total", "Escalations fired.", ("department",))
+
+
+def _hours(text: str):
+    found = []
+    for amount, unit in _DURATION.findall(text or ""):
+        found.append(float(amount) * (24 if unit.lower().startswith("d") else 1))
+    return found
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse(steps: tuple, estimate: str) -> float:
+    # "If unresolved in 48 hours, escalate" wins; otherwise the top of the
+    # estimated resolution time ("48-72 hours" -> 72).
+    for step in steps:
+        if _ESCALATION_STEP.search(step):
+            hours = _hours(step)
+            if hours:
+                return min(hours)
+    hours = _hours(estimate)
+    if not hours:
+        numbers = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", estimate or "")]
+        if numbers and re.search(r"hour|hr", estimate or "", re.I):
+            hours = numbers
+    return max(hours) if hours else DEFAULT_HOURS
+
+
+def escalate_after(plan: dict) -> float:
+    plan = plan or {}
+    return _parse(tuple(plan.get("steps") or ()), plan.get("estimated_resolution_time") or "")
+
+
+def due_time(plan: dict, filed_at: str) -> str:
+    filed = datetime.datetime.fromisoformat(filed_at)
+    return (filed + datetime.timedelta(hours=escalate_after(plan))).isoformat()
+
+
+def _epoch(iso: str) -> float:
+    return datetime.datetime.fromisoformat(iso).replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+class EscalationScheduler:
+    """Min-heap of escalation due times over open complaints.
+
+    New complaints arrive from the store's tail; due times come from the
+    record's ``escalation_due`` (set at resolve) or its plan. Firing pops
+    only what is due, skips complaints already resolved, and appends the
+    batch to ``escalations.jsonl`` under a file lock after catching up on
+    it, so workers sharing the memory dir never escalate twice.
+    """
+
+    def __init__(self, path=escalations_file):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fh = None
+        self.store_position = 0
+        self.position = 0
+        self.heap = []
+        # complaint_id -> (due epoch, department) until escalated or resolved
+        self.pending = {}
+        # department -> {complaint_id: escalation event}
+        self.escalated = {}
+        self._stop = threading.Event()
+
+    def _catch_up(self, store):
+        for entry, position in store.tail(self.store_position):
+            self.store_position = position
+            cid = entry.get("complaint_id")
+            if not cid or cid in self.pending:
+                continue
+            try:
+                due = entry.get("escalation_due") or due_time(entry.get("action_plan"),
+                                                              entry.get("timestamp"))
+                due = _epoch(due)
+            except (TypeError, ValueError):
+                continue
+            department = storage.entry_field(entry, "department") or "Unknown"
+            self.pending[cid] = (due, department)
+            heapq.heappush(self.heap, (due, cid))
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.position:
+            with open(self.path, "rb") as f:
+                f.seek(self.position)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self.position += len(line)
+                    self._record(json.loads(line))
+
+    def _record(self, event):
+        self.pending.pop(event["complaint_id"], None)
+        self.escalated.setdefault(event["department"], {})[event["complaint_id"]] = event
+
+    def fire(self, now=None, store=None) -> int:
+        now = time.time() if now is None else now
+        view = lifecycle.get_view()
+        view.refresh(store)
+        fired = 0
+
+        with self._lock:
+            self._catch_up(store or storage.get_store())
+            while self.heap and self.heap[0][0] <= now:
+                if self._fh is None:
+                    self._fh = open(self.path, "ab")
+                if fcntl:
+                    fcntl.flock(self._fh, fcntl.LOCK_EX)
+                try:
+                    # another worker may have fired some of these already
+                    self._catch_up(store or storage.get_store())
+                    batch = []
+                    while self.heap and self.heap[0][0] <= now and len(batch) < FIRE_BATCH:
+                        due, cid = heapq.heappop(self.heap)
+                        pending = self.pending.get(cid)
+                        if pending is None or pending[0] != due:
+                            continue
+                        status = view.get(cid)
+                        if status in lifecycle.CLOSED:
+                            self.pending.pop(cid)
+                            continue
+                        batch.append({
+                            "complaint_id": cid,
+                            "department": pending[1],
+                            "due": datetime.datetime.utcfromtimestamp(due).isoformat(),
+                            "escalated_at": datetime.datetime.utcfromtimestamp(now).isoformat(),
+                            "status": status
+                        })
+
+                    if batch:
+                        self._fh.seek(0, os.SEEK_END)
+                        self._fh.write(b"".join((json.dumps(e) + "\n").encode("utf-8") for e in batch))
+                        self._fh.flush()
+                        os.fsync(self._fh.fileno())
+                        self._catch_up(store or storage.get_store())
+                        for event in batch:
+                            FIRED.inc(department=event["department"])
+                        fired += len(batch)
+                finally:
+                    if fcntl:
+                        fcntl.flock(self._fh, fcntl.LOCK_UN)
+        return fired
+
+    def overdue(self, department=None, limit=100) -> dict:
+        # Escalated complaints that are still open, oldest due first.
+        view = lifecycle.get_view()
+        counts = {}
+        complaints = []
+        with self._lock:
+            departments = [department] if department is not None else list(self.escalated)
+            for dept in departments:
+                events = self.escalated.get(dept, {})
+                for cid in [c for c in events if view.get(c) in lifecycle.CLOSED]:
+                    del events[cid]
+                if events:
+                    counts[dept] = len(events)
+                    complaints.extend(events.values())
+
+        complaints.sort(key=lambda e: e["due"])
+        now = time.time()
+        return {
+            "by_department": counts,
+            "complaints": [dict(e, status=view.get(e["complaint_id"]),
+                                hours_overdue=round((now - _epoch(e["due"])) / 3600, 1))
+                           for e in complaints[:limit]]
+        }
+
+    def run(self, tick=TICK):
+        while not self._stop.wait(min(tick, self._until_next())):
+            try:
+                self.fire()
+            except Exception:
+                logger.exception("Escalation run failed")
+
+    def _until_next(self) -> float:
+        with self._lock:
+            if not self.heap:
+                return TICK
+            return max(0.0, self.heap[0][0] - time.time())
+
+    def start(self, tick=TICK):
+        if tick <= 0:
+            return
+        threading.Thread(target=self.run, args=(tick,), name="escalations", daemon=True).start()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> EscalationScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = EscalationScheduler()
+    return _scheduler
+
+
+def close_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.close()
+        _scheduler = None
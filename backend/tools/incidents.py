@@ -0,0 +1,238 @@
+import json
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from backend.tools import storage
+from backend.tools.cache import normalize
+
+incidents_file = os.path.join(storage.MEMORY_DIR, "incidents.jsonl")
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# estimated Jaccard needed to join an existing incident
+SIMILARITY = float(os.environ.get("CIVICASSIST_INCIDENT_SIMILARITY", "0.5"))
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(20251130)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+
+def shingles(text: str) -> set:
+    words = normalize(text).split()
+    grams = set(words)
+    grams.update(a + " " + b for a, b in zip(words, words[1:]))
+    return {zlib.crc32(g.encode("utf-8")) for g in grams}
+
+
+def signature(text: str) -> np.ndarray:
+    hashes = np.fromiter(shingles(text), dtype=np.uint64)
+    if not len(hashes):
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    # (a * x + b) mod p for every permutation and shingle, min per permutation
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float((a == b).mean())
+
+
+class IncidentIndex:
+    def __init__(self, path=incidents_file):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fh = None
+        self.position = 0
+        self.incidents = {}
+        # (city, issue_type) -> {(band, band hash) -> [incident ids]}
+        self.buckets = {}
+
+    def _partition(self, city, issue_type):
+        return self.buckets.setdefault((city, issue_type), {})
+
+    def _band_keys(self, sig):
+        return [(b, sig[b * ROWS:(b + 1) * ROWS].tobytes()) for b in range(BANDS)]
+
+    def _apply(self, rec: dict):
+        if rec.get("retracted"):
+            self._remove(rec)
+            return
+
+        iid = rec["incident_id"]
+        incident = self.incidents.get(iid)
+        if incident is None:
+            sig = np.asarray(rec["signature"], dtype=np.uint64)
+            incident = {
+                "incident_id": iid,
+                "state": rec.get("state"),
+                "city": rec.get("city"),
+                "issue_type": rec.get("issue_type"),
+                "sample_text": rec.get("complaint_text"),
+                "first_seen": rec.get("timestamp"),
+                "last_seen": rec.get("timestamp"),
+                "complaint_ids": [],
+                # user_id -> complaints, so a retraction can drop the user
+                "users": {},
+                "signature": sig
+            }
+            self.incidents[iid] = incident
+            buckets = self._partition(rec.get("city"), rec.get("issue_type"))
+            for key in self._band_keys(sig):
+                buckets.setdefault(key, []).append(iid)
+
+        incident["complaint_ids"].append(rec["complaint_id"])
+        users = incident["users"]
+        users[rec.get("user_id")] = users.get(rec.get("user_id"), 0) + 1
+        incident["last_seen"] = max(incident["last_seen"] or "", rec.get("timestamp") or "")
+
+    def _remove(self, rec: dict):
+        iid = rec["incident_id"]
+        incident = self.incidents.get(iid)
+        if incident is None or rec["complaint_id"] not in incident["complaint_ids"]:
+            return
+        incident["complaint_ids"].remove(rec["complaint_id"])
+        users = incident["users"]
+        user_id = rec.get("user_id")
+        users[user_id] = users.get(user_id, 0) - 1
+        if users[user_id] <= 0:
+            del users[user_id]
+        if incident["complaint_ids"]:
+            return
+
+        del self.incidents[iid]
+        buckets = self._partition(incident["city"], incident["issue_type"])
+        for key in self._band_keys(incident["signature"]):
+            ids = buckets.get(key)
+            if ids and iid in ids:
+                ids.remove(iid)
+                if not ids:
+                    del buckets[key]
+
+    def _append(self, recs):
+        # Caller holds the lock and has caught up.
+        if self._fh is None:
+            self._fh = open(self.path, "ab")
+        data = b"".join((json.dumps(rec) + "\n").encode("utf-8") for rec in recs)
+        self._fh.write(data)
+        self._fh.flush()
+        # only advance past our own lines if nobody else appended first
+        if self._fh.tell() == self.position + len(data):
+            self.position += len(data)
+            for rec in recs:
+                self._apply(rec)
+        else:
+            self._catch_up()
+
+    def _catch_up(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) <= self.position:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.position)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.position += len(line)
+                self._apply(json.loads(line))
+
+    def assign(self, entry: dict) -> str:
+        city = entry.get("city")
+        issue_type = storage.entry_field(entry, "issue_type")
+        sig = signature(entry.get("complaint_text") or "")
+
+        with self._lock:
+            self._catch_up()
+
+            # candidates share at least one LSH band within the same partition
+            buckets = self._partition(city, issue_type)
+            best, best_sim = None, 0.0
+            seen = set()
+            for key in self._band_keys(sig):
+                for iid in buckets.get(key, ()):
+                    if iid in seen:
+                        continue
+                    seen.add(iid)
+                    sim = similarity(sig, self.incidents[iid]["signature"])
+                    if sim > best_sim:
+                        best, best_sim = iid, sim
+
+            iid = best if best is not None and best_sim >= SIMILARITY else "i-" + entry["complaint_id"][2:]
+            rec = {
+                "incident_id": iid,
+                "complaint_id": entry["complaint_id"],
+                "user_id": entry.get("user_id"),
+                "state": entry.get("state"),
+                "city": city,
+                "issue_type": issue_type,
+                "complaint_text": entry.get("complaint_text"),
+                "timestamp": entry.get("timestamp"),
+                "signature": sig.tolist()
+            }
+
+            self._append([rec])
+        return iid
+
+    def retract(self, entries):
+        # Takes complaints whose write failed out of their incidents again;
+        # the retraction goes through the file, so every worker sees it.
+        recs = [{"incident_id": e["incident_id"], "complaint_id": e["complaint_id"],
+                 "user_id": e.get("user_id"), "retracted": True}
+                for e in entries if e.get("incident_id")]
+        if not recs:
+            return
+        with self._lock:
+            self._catch_up()
+            self._append(recs)
+
+    def query(self, state=None, city=None, issue_type=None, min_size=1, limit=100) -> list:
+        with self._lock:
+            self._catch_up()
+            rows = [
+                i for i in self.incidents.values()
+                if len(i["complaint_ids"]) >= min_size
+                and (state is None or i["state"] == state)
+                and (city is None or i["city"] == city)
+                and (issue_type is None or i["issue_type"] == issue_type)
+            ]
+            rows.sort(key=lambda i: (-len(i["complaint_ids"]), i["last_seen"] or ""))
+
+            return [{
+                "incident_id": i["incident_id"],
+                "state": i["state"],
+                "city": i["city"],
+                "issue_type": i["issue_type"],
+                "sample_text": i["sample_text"],
+                "complaints": len(i["complaint_ids"]),
+                "users": len(i["users"]),
+                "first_seen": i["first_seen"],
+                "last_seen": i["last_seen"],
+                "complaint_ids": i["complaint_ids"][-20:]
+            } for i in rows[:limit]]
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> IncidentIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = IncidentIndex()
+                # first run: cluster what is already on file
+                if not os.path.exists(index.path):
+                    for entry in storage.get_store().scan():
+                        if entry.get("complaint_id"):
+                            index.assign(entry)
+                _index = index
+    return _index
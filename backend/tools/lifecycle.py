@@ -0,0 +1,329 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+from backend.tools import storage
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+events_file = os.path.join(storage.MEMORY_DIR, "status_events.jsonl")
+snapshot_file = os.path.join(storage.MEMORY_DIR, "status_view.json")
+
+STATUSES = ["Pending", "In Progress", "Resolved"]
+INITIAL_STATUS = "Pending"
+# Resolved complaints can be reopened; anything else goes through In Progress.
+TRANSITIONS = {
+    "Pending": {"In Progress", "Resolved"},
+    "In Progress": {"Pending", "Resolved"},
+    "Resolved": {"In Progress"}
+}
+CLOSED = {"Resolved"}
+# the record fields the view reads
+COLUMNS = ["complaint_id", "status", "department", "timestamp"]
+
+# Checkpoint the view after this many changes. A checkpoint appends just the
+# rows and counts that changed; the deltas are folded into a full snapshot
+# once they outgrow it.
+SNAPSHOT_EVERY = 100
+MIN_COMPACT_BYTES = 1 << 20
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def _reached(position, other) -> bool:
+    # whether `position` is at or past `other` in every log (shard positions
+    # are dicts)
+    if isinstance(position, dict) or isinstance(other, dict):
+        position, other = position or {}, other or {}
+        if not (isinstance(position, dict) and isinstance(other, dict)):
+            return False
+        return all(position.get(k, 0) >= v for k, v in other.items())
+    return position >= other
+
+
+class StatusView:
+    """Current status per complaint, folded from the store and the event log.
+
+    New complaints come from the store's tail with their initial status;
+    ``status_events.jsonl`` holds every later change. Counts per
+    (department, day, status) are kept next to it so summaries never replay
+    either log.
+
+    The view is a function of the two log positions, so checkpoints from
+    different workers chain: a worker appends its changes only if it has
+    read at least as far as the last checkpoint, and the ``.head`` file
+    records where that is.
+    """
+
+    def __init__(self, path=events_file, snapshot=snapshot_file):
+        self.path = path
+        self.snapshot = snapshot
+        self.deltas = os.path.splitext(snapshot)[0] + ".deltas.jsonl"
+        self.head = os.path.splitext(snapshot)[0] + ".head.json"
+        self._lock = threading.Lock()
+        self._fh = None
+        self._deltas_fh = None
+        self.store_position = 0
+        self.position = 0
+        # complaint_id -> [status, department, day]
+        self.current = {}
+        self.counts = {}
+        # complaint_id -> status, for events read before their complaint
+        self.orphans = {}
+        self._changed = set()
+        self._changed_counts = set()
+        self._pending = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.snapshot, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if snap.get("store") != storage.STORE_LAYOUT:
+            return
+        self._restore(snap)
+
+        generation = snap.get("generation")
+        try:
+            with open(self.deltas, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        delta = json.loads(line)
+                    except ValueError:
+                        break  # torn by a crash; everything after builds on it
+                    if generation is not None and delta.get("generation") == generation:
+                        self._restore(delta)
+        except OSError:
+            pass
+
+    def _restore(self, snap):
+        self.store_position = snap["store_position"]
+        self.position = snap["position"]
+        self.current.update(snap["current"])
+        for *k, n in snap["counts"]:
+            self.counts[tuple(k)] = n
+        self.orphans = snap.get("orphans", {})
+
+    def _read_head(self):
+        try:
+            with open(self.head, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_json(self, path, data):
+        tmp = path + f".{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _save(self):
+        if self._deltas_fh is None:
+            self._deltas_fh = open(self.deltas, "ab")
+        fh = self._deltas_fh
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            head = self._read_head()
+            if head is not None and head.get("store") == storage.STORE_LAYOUT and \
+                    not (_reached(self.store_position, head["store_position"]) and
+                         self.position >= head["position"]):
+                # another worker has checkpointed further; ours would go
+                # backwards, so keep the changes for the next attempt
+                self._pending = 0
+                return
+
+            size = fh.seek(0, os.SEEK_END)
+            try:
+                snapshot_size = os.path.getsize(self.snapshot)
+            except OSError:
+                snapshot_size = 0
+            torn = False
+            if size:
+                with open(self.deltas, "rb") as f:
+                    f.seek(size - 1)
+                    torn = f.read(1) != b"\n"
+
+            if head is None or head.get("store") != storage.STORE_LAYOUT or torn or \
+                    size > max(MIN_COMPACT_BYTES, snapshot_size):
+                generation = time.time_ns()
+                self._write_json(self.snapshot, {
+                    "store": storage.STORE_LAYOUT,
+                    "generation": generation,
+                    "store_position": self.store_position,
+                    "position": self.position,
+                    "current": self.current,
+                    "counts": [[*k, n] for k, n in self.counts.items() if n],
+                    "orphans": self.orphans
+                })
+                os.ftruncate(fh.fileno(), 0)
+            else:
+                generation = head["generation"]
+                delta = {
+                    "generation": generation,
+                    "store_position": self.store_position,
+                    "position": self.position,
+                    "current": {cid: self.current[cid] for cid in self._changed},
+                    "counts": [[*k, self.counts.get(k, 0)] for k in self._changed_counts],
+                    "orphans": self.orphans
+                }
+                fh.write((json.dumps(delta) + "\n").encode("utf-8"))
+                fh.flush()
+
+            self._write_json(self.head, {
+                "store": storage.STORE_LAYOUT,
+                "generation": generation,
+                "store_position": self.store_position,
+                "position": self.position
+            })
+            self._changed = set()
+            self._changed_counts = set()
+            self._pending = 0
+        finally:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _count(self, department, day, status, delta):
+        key = (department, day, status)
+        self.counts[key] = self.counts.get(key, 0) + delta
+        self._changed_counts.add(key)
+
+    def _apply(self, event: dict):
+        cid = event["complaint_id"]
+        row = self.current.get(cid)
+        if row is None:
+            # its complaint was stored after this view last read the store;
+            # applied once the complaint shows up
+            self.orphans[cid] = event["status"]
+            self._pending += 1
+            return
+        if row[0] == event["status"]:
+            return
+        self._count(row[1], row[2], row[0], -1)
+        row[0] = event["status"]
+        self._count(row[1], row[2], row[0], 1)
+        self._changed.add(cid)
+        self._pending += 1
+
+    def _catch_up(self, store):
+        for entry, position in store.tail(self.store_position, COLUMNS):
+            cid = entry.get("complaint_id")
+            if cid and cid not in self.current:
+                row = [entry.get("status") or INITIAL_STATUS,
+                       storage.entry_field(entry, "department") or "Unknown",
+                       (entry.get("timestamp") or "")[:10] or "unknown"]
+                self.current[cid] = row
+                self._count(row[1], row[2], row[0], 1)
+                self._changed.add(cid)
+                self._pending += 1
+                status = self.orphans.pop(cid, None)
+                if status is not None:
+                    self._apply({"complaint_id": cid, "status": status})
+            self.store_position = position
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.position:
+            with open(self.path, "rb") as f:
+                f.seek(self.position)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self.position += len(line)
+                    self._apply(json.loads(line))
+
+        if self._pending >= SNAPSHOT_EVERY:
+            self._save()
+
+    def refresh(self, store=None):
+        with self._lock:
+            self._catch_up(store or storage.get_store())
+
+    def get(self, complaint_id: str):
+        row = self.current.get(complaint_id)
+        return row[0] if row else None
+
+    def update(self, complaint_id: str, status: str, note=None, store=None) -> dict:
+        if status not in STATUSES:
+            raise InvalidTransition(f"Unknown status: {status}")
+
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.path, "ab")
+            if fcntl:
+                fcntl.flock(self._fh, fcntl.LOCK_EX)
+            try:
+                # under the file lock, so no other worker can move it meanwhile
+                self._catch_up(store or storage.get_store())
+                row = self.current.get(complaint_id)
+                if row is None:
+                    raise KeyError(complaint_id)
+
+                previous = row[0]
+                if status not in TRANSITIONS.get(previous, set(STATUSES)):
+                    raise InvalidTransition(f"Cannot move from {previous} to {status}")
+
+                event = {
+                    "complaint_id": complaint_id,
+                    "status": status,
+                    "previous": previous,
+                    "note": note,
+                    "timestamp": datetime.datetime.utcnow().isoformat()
+                }
+                self._fh.seek(0, os.SEEK_END)
+                self._fh.write((json.dumps(event) + "\n").encode("utf-8"))
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+                self._catch_up(store or storage.get_store())
+            finally:
+                if fcntl:
+                    fcntl.flock(self._fh, fcntl.LOCK_UN)
+        return event
+
+    def summary(self, since=None, until=None) -> dict:
+        by_status = {}
+        by_department = {}
+        with self._lock:
+            for (department, day, status), n in self.counts.items():
+                if not n or (since and day < since) or (until and day > until):
+                    continue
+                by_status[status] = by_status.get(status, 0) + n
+                if status not in CLOSED:
+                    by_department[department] = by_department.get(department, 0) + n
+        return {"by_status": by_status, "open_by_department": by_department}
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._save()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            for fh in (self._fh, self._deltas_fh):
+                if fh is not None:
+                    fh.close()
+            self._fh = self._deltas_fh = None
+
+
+_view = None
+_view_lock = threading.Lock()
+
+
+def get_view() -> StatusView:
+    global _view
+    if _view is None:
+        with _view_lock:
+            if _view is None:
+                _view = StatusView()
+    return _view
@@ -0,0 +1,124 @@
+import bisect
+import threading
+
+# Per-process metrics in the Prometheus text format. With several workers
+# each one is scraped (or aggregated) separately.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_registry = []
+_collectors = []
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.buckets = tuple(buckets)
+        # key -> [per-bucket counts (non-cumulative, +Inf last), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_labels(names, key + (_number(bound),))} "
+                                 f"{cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def collector(fn):
+    """Registers ``fn() -> [(name, type, help, [(labels dict, value)])]``,
+    called at scrape time for values owned elsewhere (cache stats, ...)."""
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for fn in _collectors:
+        for name, kind, help, samples in fn():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REQUESTS = Counter("civicassist_http_requests_total", "HTTP requests handled.",
+                   ("method", "path", "status"))
+REQUEST_SECONDS = Histogram("civicassist_http_request_duration_seconds",
+                            "Time to produce the response headers.", ("method", "path"))
+REQUEST_BYTES = Histogram("civicassist_http_request_size_bytes",
+                          "Request body size from Content-Length.", ("method", "path"),
+                          buckets=SIZE_BUCKETS)
+STAGE_SECONDS = Histogram("civicassist_stage_duration_seconds",
+                          "Time spent per pipeline stage.", ("stage",))
+STAGE_OUTCOMES = Counter("civicassist_stage_outcomes_total",
+                         "Pipeline stage results by status.", ("stage", "status"))
+ATTACHMENT_BYTES = Histogram("civicassist_attachment_size_bytes",
+                             "Size of attachments written to the blob store.",
+                             buckets=SIZE_BUCKETS)
+STORAGE_FAILURES = Counter("civicassist_storage_failures_total",
+                           "Failed writes to the complaint store.", ("operation",))
@@ -0,0 +1,219 @@
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+import zlib
+
+import numpy as np
+
+from backend.tools import archive, storage
+
+MODEL_DIR = os.environ.get("CIVICASSIST_MODEL_DIR", os.path.join(storage.MEMORY_DIR, "classifier_model"))
+FEWSHOT_FILE = os.path.join("agents", "prompts", "classifier_fewshot.json")
+
+N_FEATURES = 2 ** 16
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokens(text: str) -> list:
+    words = TOKEN.findall(text.lower())
+    return words + [a + " " + b for a, b in zip(words, words[1:])]
+
+
+def hash_features(text: str, n_features=N_FEATURES):
+    # Term counts hashed into a fixed-size space; no vocabulary to store.
+    counts = {}
+    for tok in tokens(text):
+        h = zlib.crc32(tok.encode("utf-8")) % n_features
+        counts[h] = counts.get(h, 0) + 1
+    idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+    return idx, 1.0 + np.log(tf) if len(tf) else tf
+
+
+def vectorize(texts, idf, n_features=N_FEATURES):
+    # CSR rows of L2-normalised tf-idf.
+    indptr, indices, data = [0], [], []
+    for text in texts:
+        idx, tf = hash_features(text, n_features)
+        values = tf * idf[idx]
+        norm = np.sqrt((values ** 2).sum())
+        if norm:
+            values = values / norm
+        indices.append(idx)
+        data.append(values)
+        indptr.append(indptr[-1] + len(idx))
+
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+    data = np.concatenate(data) if data else np.zeros(0)
+    return np.asarray(indptr), indices, data
+
+
+def _row_ids(indptr):
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def _logits(csr, weights, bias):
+    indptr, indices, data = csr
+    out = np.tile(np.asarray(bias, dtype=np.float64), (len(indptr) - 1, 1))
+    np.add.at(out, _row_ids(indptr), data[:, None] * weights[indices])
+    return out
+
+
+def _softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def train(texts, labels, epochs=300, lr=2.0, l2=1e-4, n_features=N_FEATURES):
+    classes = sorted(set(labels))
+    y = np.array([classes.index(l) for l in labels])
+
+    df = np.zeros(n_features)
+    for text in texts:
+        df[np.unique(hash_features(text, n_features)[0])] += 1
+    idf = np.log((1 + len(texts)) / (1 + df)) + 1.0
+
+    csr = vectorize(texts, idf, n_features)
+    rows = _row_ids(csr[0])
+    onehot = np.eye(len(classes))[y]
+
+    weights = np.zeros((n_features, len(classes)))
+    bias = np.zeros(len(classes))
+    for _ in range(epochs):
+        grad = (_softmax(_logits(csr, weights, bias)) - onehot) / len(texts)
+        grad_w = l2 * weights
+        np.add.at(grad_w, csr[1], csr[2][:, None] * grad[rows])
+        weights -= lr * grad_w
+        bias -= lr * grad.sum(axis=0)
+
+    return {"classes": classes, "idf": idf, "weights": weights, "bias": bias}
+
+
+def save_model(model, path=MODEL_DIR):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "idf.npy"), model["idf"])
+    np.save(os.path.join(path, "weights.npy"), model["weights"])
+    np.save(os.path.join(path, "bias.npy"), model["bias"])
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"classes": model["classes"], "n_features": len(model["idf"])}, f, indent=2)
+
+
+def load_model(path=MODEL_DIR):
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return {
+        "classes": meta["classes"],
+        # memory-mapped so every worker shares the same pages
+        "idf": np.load(os.path.join(path, "idf.npy"), mmap_mode="r"),
+        "weights": np.load(os.path.join(path, "weights.npy"), mmap_mode="r"),
+        "bias": np.load(os.path.join(path, "bias.npy"))
+    }
+
+
+class LinearClassifier:
+    def __init__(self, model):
+        self.classes = model["classes"]
+        self.idf = model["idf"]
+        self.weights = model["weights"]
+        self.bias = model["bias"]
+        self.n_features = len(self.idf)
+
+    def classify_batch(self, texts) -> list:
+        csr = vectorize(texts, self.idf, self.n_features)
+        probs = _softmax(_logits(csr, self.weights, self.bias))
+
+        results = []
+        for r, text in enumerate(texts):
+            best = int(probs[r].argmax())
+            # tokens pushing hardest towards the winning class
+            toks = sorted(set(tokens(text)),
+                          key=lambda t: -self.weights[zlib.crc32(t.encode("utf-8")) % self.n_features, best])
+            results.append({
+                "issue_type": self.classes[best],
+                "confidence": round(float(probs[r, best]), 2),
+                "highlights": toks[:3],
+                "scores": {c: round(float(p), 3) for c, p in zip(self.classes, probs[r])}
+            })
+        return results
+
+    def classify(self, text: str) -> dict:
+        return self.classify_batch([text])[0]
+
+
+def _stored_examples():
+    # (text, issue type) pairs read straight off disk. get_store() would
+    # migrate the legacy JSON, move attachments into blobs and rewrite the
+    # CSV mirror; training must leave the memory dir as it found it.
+    if storage.SHARD_BY:
+        dirs = sorted(glob.glob(os.path.join(storage.MEMORY_DIR, "shards", "*", "")))
+    else:
+        dirs = [storage.MEMORY_DIR]
+
+    found = False
+    for directory in dirs:
+        db = os.path.join(directory, "complaints.db")
+        if storage.STORE_KIND == "sqlite" and os.path.exists(db):
+            found = True
+            conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+            try:
+                yield from conn.execute("SELECT complaint_text, issue_type FROM complaints")
+            finally:
+                conn.close()
+            continue
+
+        log = os.path.join(directory, "complaints.jsonl")
+        if os.path.exists(log):
+            found = True
+            archived = archive.Archive(os.path.join(directory, "archive"))
+            for entry in archived.scan(["complaint_text", "issue_type"]):
+                yield entry.get("complaint_text"), storage.entry_field(entry, "issue_type")
+            for entry, _ in storage.tail_log(log):
+                yield entry.get("complaint_text"), storage.entry_field(entry, "issue_type")
+
+    # not migrated yet
+    if not found and os.path.exists(storage.memory_file):
+        with open(storage.memory_file, "r", encoding="utf-8") as f:
+            for entry in json.load(f):
+                yield entry.get("complaint_text"), storage.entry_field(entry, "issue_type")
+
+
+def training_data():
+    # Labelled examples: stored complaint history plus the few-shot prompts,
+    # with few-shot labels mapped onto the keyword classifier's issue types.
+    from backend.tools.classifier import load_classifier
+
+    keyword = load_classifier()
+    seen = {}
+
+    for text, label in _stored_examples():
+        if text and label:
+            seen[text.strip().lower()] = (text, keyword.labels.get(label, label))
+
+    if os.path.exists(FEWSHOT_FILE):
+        with open(FEWSHOT_FILE, "r", encoding="utf-8") as f:
+            for ex in json.load(f):
+                label = keyword.labels.get(ex["label"], ex["label"])
+                seen[ex["input_text"].strip().lower()] = (ex["input_text"], label)
+
+    # the configured keywords double as tiny seed documents
+    for c in keyword.categories:
+        for k in c["keywords"]:
+            seen.setdefault(k, (k, c["issue_type"]))
+
+    texts = [t for t, _ in seen.values()]
+    labels = [l for _, l in seen.values()]
+    return texts, labels
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["train"]:
+        print("usage: python -m backend.tools.ml_classifier train")
+        sys.exit(1)
+
+    texts, labels = training_data()
+    save_model(train(texts, labels))
+    print(f"Trained on {len(texts)} examples, saved to {MODEL_DIR}")
@@ -0,0 +1,165 @@
+import asyncio
+import datetime
+import logging
+import os
+import time
+import uuid
+
+from backend.tools import blobs, cache, classifier, department_lookup, metrics
+
+logger = logging.getLogger(__name__)
+
+STAGE_TIMEOUT = float(os.environ.get("CIVICASSIST_STAGE_TIMEOUT", "2.0"))
+ATTACHMENT_TIMEOUT = float(os.environ.get("CIVICASSIST_ATTACHMENT_TIMEOUT", "30.0"))
+
+# metric label per agent
+STAGES = {
+    "ClassifierAgent": "classify",
+    "MapperAgent": "map",
+    "PlannerAgent": "plan",
+    "AttachmentAgent": "attachments"
+}
+
+
+def a2a_request(agent: str, request_id: str, user_id: str, complaint_text: str,
+                attachments_meta=None, session_id=None) -> dict:
+    return {
+        "request_id": request_id,
+        "agent": agent,
+        "input": {
+            "user_id": user_id,
+            "session_id": session_id,
+            "complaint_text": complaint_text,
+            "ocr_text": None,
+            "attachments_meta": attachments_meta or []
+        },
+        "meta": {"timestamp": datetime.datetime.utcnow().isoformat()}
+    }
+
+
+async def run_stage(request: dict, fn, args=(), fallback=None, timeout=STAGE_TIMEOUT,
+                    model_used="heuristic", threaded=True, why=None) -> dict:
+    # Runs one agent and wraps its output in an A2A response envelope.
+    # Blocking agents run in a thread so the event loop stays free; on error
+    # or timeout the fallback (if any) answers instead.
+    start = time.perf_counter()
+    status = "success"
+    try:
+        if threaded:
+            output = await asyncio.wait_for(asyncio.to_thread(fn, *args), timeout)
+        else:
+            output = fn(*args)
+    except Exception as e:
+        logger.warning("%s failed (%r)", request["agent"], e)
+        if fallback is None:
+            output, status = None, "error"
+        else:
+            output, status, model_used = fallback(*args), "fallback", "heuristic"
+
+    elapsed = time.perf_counter() - start
+    stage = STAGES.get(request["agent"], request["agent"])
+    metrics.STAGE_SECONDS.observe(elapsed, stage=stage)
+    metrics.STAGE_OUTCOMES.inc(stage=stage, status=status)
+
+    return {
+        "request_id": request["request_id"],
+        "agent": request["agent"],
+        "status": status,
+        "output": output,
+        "timing_ms": round(elapsed * 1000, 3),
+        "model_used": model_used,
+        "explainability": {"why": why(output) if why and output is not None else ""}
+    }
+
+
+def _ingest_all(attachments):
+    return [blobs.ingest_attachment(a) for a in attachments]
+
+
+def _explain_classification(output):
+    return f"Keywords: {', '.join(output.get('highlights', [])) or 'none'}"
+
+
+async def orchestrate(user_id: str, complaint_text: str, state=None, city=None,
+                      attachments=(), session_id=None) -> dict:
+    request_id = "r-" + str(uuid.uuid4())
+    started = time.perf_counter()
+
+    def request(agent):
+        return a2a_request(agent, request_id, user_id, complaint_text, session_id=session_id)
+
+    # Attachment decoding does not depend on the text pipeline, so it runs
+    # alongside it.
+    attachment_task = None
+    if attachments:
+        attachment_task = asyncio.create_task(run_stage(
+            request("AttachmentAgent"), _ingest_all, (list(attachments),),
+            timeout=ATTACHMENT_TIMEOUT, model_used="blob-store",
+            why=lambda out: f"{len(out)} attachment(s) stored"
+        ))
+
+    registry = department_lookup.get_registry()
+    key = cache.pipeline_key(complaint_text, state, city)
+    cached = cache.pipeline_cache.get(key)
+
+    # a registry hot reload invalidates cached mappings
+    hit = cached is not None and cached[0] is registry
+    if hit:
+        _, classification, department, action_plan = cached
+        stages = []
+    else:
+        classification, department, action_plan, stages = await _run_agents(
+            request, registry, complaint_text, state, city
+        )
+        # fallback answers are not worth remembering
+        if all(s["status"] == "success" for s in stages):
+            cache.pipeline_cache.put(key, (registry, classification, department, action_plan))
+
+    stored_attachments = []
+    if attachment_task is not None:
+        attached = await attachment_task
+        stages.append(attached)
+        stored_attachments = attached["output"]
+
+    timing = {s["agent"]: s["timing_ms"] for s in stages}
+    if hit:
+        timing["cache"] = 0.0
+    timing["total"] = round((time.perf_counter() - started) * 1000, 3)
+
+    return {
+        "request_id": request_id,
+        "classification": classification,
+        "department": department,
+        "action_plan": action_plan,
+        # None when the attachment stage failed
+        "attachments": stored_attachments,
+        "stages": stages,
+        "timing_ms": timing
+    }
+
+
+async def _run_agents(request, registry, complaint_text, state, city):
+    primary = classifier.get_classifier()
+    classified = await run_stage(
+        request("ClassifierAgent"), primary.classify, (complaint_text,),
+        fallback=classifier.get_keyword_classifier().classify,
+        model_used=type(primary).__name__, why=_explain_classification
+    )
+    classification = classified["output"]
+    issue_type = classification.get("issue_type", "")
+
+    # Mapping and planning both only need the classification; both read the
+    # same registry snapshot that keys the cache.
+    default_department, default_plan = registry.default
+    mapped, planned = await asyncio.gather(
+        run_stage(request("MapperAgent"), lambda *key: registry.lookup(*key)[0],
+                  (issue_type, state, city), fallback=lambda *a: default_department,
+                  threaded=False, model_used="registry",
+                  why=lambda out: out.get("justification", "")),
+        run_stage(request("PlannerAgent"), lambda *key: registry.lookup(*key)[1],
+                  (issue_type, state, city), fallback=lambda *a: default_plan,
+                  threaded=False, model_used="registry",
+                  why=lambda out: f"{len(out.get('steps', []))} steps for {issue_type}")
+    )
+
+    return classification, mapped["output"], planned["output"], [classified, mapped, planned]
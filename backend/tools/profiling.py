@@ -0,0 +1,46 @@
+import logging
+import os
+import random
+import re
+import time
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # profiling is optional
+    Profiler = None
+
+from backend.tools.storage import MEMORY_DIR
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests to profile (0 = off) and the slowest ones worth keeping.
+PROFILE_RATE = float(os.environ.get("CIVICASSIST_PROFILE_RATE", "0"))
+PROFILE_MIN_MS = float(os.environ.get("CIVICASSIST_PROFILE_MIN_MS", "0"))
+PROFILE_DIR = os.environ.get("CIVICASSIST_PROFILE_DIR", os.path.join(MEMORY_DIR, "profiles"))
+
+_NON_SLUG = re.compile(r"[^A-Za-z0-9]+")
+
+if PROFILE_RATE > 0 and Profiler is None:
+    logger.warning("CIVICASSIST_PROFILE_RATE is set but pyinstrument is not installed")
+
+
+def start():
+    # Returns a running profiler for a sampled request, else None.
+    if Profiler is None or PROFILE_RATE <= 0 or random.random() >= PROFILE_RATE:
+        return None
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+def finish(profiler, method: str, path: str, elapsed: float):
+    profiler.stop()
+    ms = elapsed * 1000
+    if ms < PROFILE_MIN_MS:
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = "%s-%s-%s-%dms.html" % (time.strftime("%Y%m%dT%H%M%S"), method,
+                                    _NON_SLUG.sub("_", path).strip("_") or "root", ms)
+    with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+        f.write(profiler.output_html())
@@ -0,0 +1,211 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from backend.tools import storage
+
+search_file = os.path.join(storage.MEMORY_DIR, "search.db")
+
+POOL_SIZE = int(os.environ.get("CIVICASSIST_SEARCH_POOL", "4"))
+# Records indexed per transaction while catching up.
+BATCH_SIZE = 1000
+# Matches counted past this are reported as a lower bound.
+COUNT_LIMIT = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    complaint_id TEXT UNIQUE,
+    user_id TEXT,
+    issue_type TEXT,
+    department TEXT,
+    state TEXT,
+    city TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_docs_location ON docs (state, city);
+CREATE INDEX IF NOT EXISTS idx_docs_department ON docs (department);
+CREATE INDEX IF NOT EXISTS idx_docs_timestamp ON docs (timestamp);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+    complaint_text, tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+FILTERS = {
+    "state": "d.state = ?",
+    "city": "d.city = ?",
+    "department": "d.department = ?",
+    "issue_type": "d.issue_type = ?",
+    "since": "d.timestamp >= ?",
+    "until": "d.timestamp < ?"
+}
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(q: str) -> str:
+    # Plain words only, ANDed, the last one as a prefix so partial input
+    # still matches; FTS5 operators in user input are not honoured.
+    words = _WORD.findall(q)
+    if not words:
+        return ""
+    return " ".join(f'"{w}"' for w in words) + "*"
+
+
+class SearchIndex:
+    """FTS5 index over complaint_text, fed from the store's tail.
+
+    The store position lives in the same database and moves in the same
+    transaction as the rows it covers, so several workers can catch up
+    concurrently without double-indexing.
+    """
+
+    def __init__(self, path=search_file, pool_size=POOL_SIZE):
+        self.path = path
+        self._refresh_lock = threading.Lock()
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                               isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _position(self, conn):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'position'").fetchone()
+        if row is None:
+            return 0
+        layout, position = json.loads(row[0])
+        # positions from another store layout mean nothing here
+        return position if layout == storage.STORE_LAYOUT else None
+
+    def refresh(self, store=None) -> int:
+        store = store or storage.get_store()
+        indexed = 0
+        with self._refresh_lock, self.connection() as conn:
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    position = self._position(conn)
+                    if position is None:
+                        conn.execute("DELETE FROM docs")
+                        conn.execute("DELETE FROM docs_fts")
+                        position = 0
+
+                    n = 0
+                    for entry, position in store.tail(position):
+                        cur = conn.execute(
+                            "INSERT OR IGNORE INTO docs (complaint_id, user_id, issue_type, "
+                            "department, state, city, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (entry.get("complaint_id"), entry.get("user_id"),
+                             storage.entry_field(entry, "issue_type"),
+                             storage.entry_field(entry, "department"),
+                             entry.get("state"), entry.get("city"), entry.get("timestamp")))
+                        if cur.rowcount:
+                            conn.execute("INSERT INTO docs_fts (rowid, complaint_text) VALUES (?, ?)",
+                                         (cur.lastrowid, entry.get("complaint_text") or ""))
+                        n += 1
+                        if n == BATCH_SIZE:
+                            break
+
+                    if n:
+                        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('position', ?)",
+                                     (json.dumps([storage.STORE_LAYOUT, position]),))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+
+                indexed += n
+                if n < BATCH_SIZE:
+                    return indexed
+
+    def search(self, q: str, limit=20, offset=0, **filters) -> dict:
+        expression = match_expression(q)
+        if not expression:
+            return {"total": 0, "total_exact": True, "results": []}
+
+        where = ["docs_fts MATCH ?"]
+        params = [expression]
+        for name, value in filters.items():
+            if value is not None:
+                where.append(FILTERS[name])
+                params.append(value)
+        where = " AND ".join(where)
+
+        # CROSS JOIN pins the FTS match as the outer loop; otherwise the
+        # planner may walk a docs index and run the match once per row.
+        with self.connection() as conn:
+            total = conn.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM docs_fts CROSS JOIN docs d ON d.id = docs_fts.rowid "
+                f"WHERE {where} LIMIT ?)",
+                params + [COUNT_LIMIT + 1]
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT d.complaint_id, d.user_id, d.issue_type, d.department, d.state, d.city, "
+                "d.timestamp, snippet(docs_fts, 0, '[', ']', '…', 12), bm25(docs_fts) AS score "
+                f"FROM docs_fts CROSS JOIN docs d ON d.id = docs_fts.rowid WHERE {where} "
+                "ORDER BY score LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        return {
+            "total": min(total, COUNT_LIMIT),
+            "total_exact": total <= COUNT_LIMIT,
+            "results": [{
+                "complaint_id": r[0],
+                "user_id": r[1],
+                "issue_type": r[2],
+                "department": r[3],
+                "state": r[4],
+                "city": r[5],
+                "timestamp": r[6],
+                "snippet": r[7],
+                # bm25() is lower-is-better; flip it so higher means more relevant
+                "score": round(-r[8], 4)
+            } for r in rows]
+        }
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> SearchIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SearchIndex()
+    return _index
+
+
+def close_index():
+    global _index
+    if _index is not None:
+        _index.close()
+        _index = None
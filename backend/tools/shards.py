@@ -0,0 +1,320 @@
+import base64
+import heapq
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+
+from backend.tools import metrics, storage
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SHARD_DIR = os.path.join(storage.MEMORY_DIR, "shards")
+CATALOG_NAME = "catalog.json"
+
+_NON_SLUG = re.compile(r"[^a-z0-9]+")
+
+
+def slug(value) -> str:
+    return _NON_SLUG.sub("-", str(value or "").lower()).strip("-") or "unknown"
+
+
+def shard_key(shard_by: str, state, city=None) -> str:
+    if shard_by == "state_city":
+        return slug(state) + "/" + slug(city)
+    return slug(state)
+
+
+def encode_cursor(positions: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(positions).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    positions = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    if not isinstance(positions, dict) or not all(isinstance(v, int) for v in positions.values()):
+        raise ValueError("Invalid cursor")
+    return positions
+
+
+def _open_shard(directory: str):
+    log_path = os.path.join(directory, "complaints.jsonl")
+    if storage.STORE_KIND == "sqlite":
+        from backend.tools.sqlite_store import SqliteComplaintStore
+        store = SqliteComplaintStore(os.path.join(directory, "complaints.db"))
+        store.import_log(log_path)
+        return store
+    return storage.ComplaintLog(log_path)
+
+
+def _write_catalog(path: str, catalog: dict):
+    tmp = path + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def split_log(shard_by: str, log_path=storage.log_file, root=SHARD_DIR) -> int:
+    """One-shot split of the single complaint log into per-location shards.
+
+    Everything is written under a temporary directory, catalog included, and
+    renamed into place at the end, so a crash leaves either no shards or all
+    of them. Workers starting together serialise on ``<root>.lock``; the
+    first one splits and the rest find the catalog in place.
+    """
+    if os.path.exists(os.path.join(root, CATALOG_NAME)):
+        return 0
+
+    os.makedirs(os.path.dirname(root) or ".", exist_ok=True)
+    with open(root + ".lock", "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(os.path.join(root, CATALOG_NAME)):
+            return 0
+        return _split(shard_by, log_path, root)
+
+
+def _split(shard_by, log_path, root) -> int:
+    tmp_root = root + ".tmp"
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    os.makedirs(tmp_root)
+
+    catalog = {"shard_by": shard_by, "shards": {}}
+    files = {}
+    n = 0
+    try:
+        if os.path.exists(log_path):
+            with open(log_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    entry = json.loads(line)
+                    key = shard_key(shard_by, entry.get("state"), entry.get("city"))
+                    if key not in files:
+                        os.makedirs(os.path.join(tmp_root, key), exist_ok=True)
+                        files[key] = open(os.path.join(tmp_root, key, "complaints.jsonl"), "wb")
+                        catalog["shards"][key] = {
+                            "state": entry.get("state"),
+                            "city": entry.get("city") if shard_by == "state_city" else None,
+                            "path": key
+                        }
+                    files[key].write(line)
+                    n += 1
+    finally:
+        for fh in files.values():
+            fh.flush()
+            os.fsync(fh.fileno())
+            fh.close()
+
+    _write_catalog(os.path.join(tmp_root, CATALOG_NAME), catalog)
+    shutil.rmtree(root, ignore_errors=True)
+    os.replace(tmp_root, root)
+    return n
+
+
+class ShardedStore:
+    """Complaint store split into one log (or database) per state or city.
+
+    ``catalog.json`` maps shard keys to their location and directory, so
+    location-filtered reads open only the matching shards and writes to
+    different shards never share a lock. A shard's ``path`` may be edited to
+    point anywhere (e.g. another disk); relative paths are under ``root``.
+    """
+
+    def __init__(self, shard_by: str, root=SHARD_DIR):
+        self.root = root
+        self.catalog_path = os.path.join(root, CATALOG_NAME)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.shards = {}
+        self.mirrors = {}
+        self.catalog = {"shard_by": shard_by, "shards": {}}
+        os.makedirs(root, exist_ok=True)
+        self._refresh()
+
+        if self.catalog["shard_by"] != shard_by:
+            logger.warning("Shards on disk are split by %s, not %s; keeping the existing layout",
+                           self.catalog["shard_by"], shard_by)
+        self.shard_by = self.catalog["shard_by"]
+
+    def _refresh(self):
+        # Picks up shards created by other workers.
+        try:
+            mtime = os.path.getmtime(self.catalog_path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+
+        with open(self.catalog_path, "r", encoding="utf-8") as f:
+            self.catalog = json.load(f)
+        self._mtime = mtime
+
+    def _shard(self, key: str):
+        shard = self.shards.get(key)
+        if shard is None:
+            with self._lock:
+                shard = self.shards.get(key)
+                if shard is None:
+                    path = self.catalog["shards"][key]["path"]
+                    shard = _open_shard(os.path.join(self.root, path))
+                    self.shards[key] = shard
+        return shard
+
+    def _shard_for(self, entry: dict):
+        key = shard_key(self.shard_by, entry.get("state"), entry.get("city"))
+        if key not in self.catalog["shards"]:
+            self._refresh()
+        if key not in self.catalog["shards"]:
+            self._register(key, entry.get("state"), entry.get("city"))
+        return key, self._shard(key)
+
+    def _register(self, key, state, city):
+        # catalog.json.lock serialises catalog edits across workers
+        with self._lock, open(self.catalog_path + ".lock", "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self._mtime = None
+            self._refresh()
+            if key not in self.catalog["shards"]:
+                os.makedirs(os.path.join(self.root, key), exist_ok=True)
+                catalog = json.loads(json.dumps(self.catalog))
+                catalog["shards"][key] = {
+                    "state": state,
+                    "city": city if self.shard_by == "state_city" else None,
+                    "path": key
+                }
+                _write_catalog(self.catalog_path, catalog)
+                self.catalog = catalog
+                self._mtime = os.path.getmtime(self.catalog_path)
+
+    def keys(self, state=None, city=None) -> list:
+        # Shards that can hold records for this location.
+        self._refresh()
+        return [
+            key for key, info in self.catalog["shards"].items()
+            if (state is None or info["state"] == state)
+            and (city is None or info["city"] is None or info["city"] == city)
+        ]
+
+    def append(self, entry: dict):
+        return self._shard_for(entry)[1].append(entry)
+
+    def append_many(self, entries):
+        groups = {}
+        for entry in entries:
+            key, shard = self._shard_for(entry)
+            groups.setdefault(key, (shard, []))[1].append(entry)
+
+        written = []
+        for key, (shard, group) in groups.items():
+            try:
+                shard.append_many(group)
+            except Exception as e:
+                if written:
+                    raise storage.PartialAppend(written, e) from e
+                raise
+            written.extend(entry.get("complaint_id") for entry in group)
+
+        if storage.STORE_KIND != "sqlite":
+            # durable already; a mirror that falls behind catches up next time
+            for key in groups:
+                try:
+                    self._mirror(key).catch_up()
+                except Exception:
+                    metrics.STORAGE_FAILURES.inc(operation="csv_write")
+                    logger.exception("CSV mirror of shard %s is behind its log", key)
+
+    def _mirror(self, key):
+        mirror = self.mirrors.get(key)
+        if mirror is None:
+            directory = os.path.join(self.root, self.catalog["shards"][key]["path"])
+            mirror = self.mirrors.setdefault(key, storage.CsvMirror(
+                os.path.join(directory, "complaints.jsonl"), os.path.join(directory, "complaints.csv")))
+        return mirror
+
+    def compact(self, cutoff: str) -> int:
+        if storage.STORE_KIND == "sqlite":
+            raise RuntimeError("Archiving works with the log store only")
+        moved = 0
+        for key in self.keys():
+            n = self._shard(key).compact(cutoff)
+            if n:
+                self._mirror(key).catch_up()
+            moved += n
+        return moved
+
+    def decode_cursor(self, cursor: str) -> dict:
+        return decode_cursor(cursor)
+
+    def history(self, user_id, limit=storage.HISTORY_PAGE_SIZE, cursor=None):
+        # Newest-first across shards, merged on timestamp. The cursor holds
+        # each shard's own cursor; 0 marks a shard with nothing older left.
+        positions = dict(cursor or {})
+        pages = {}
+        for key in self.keys():
+            if positions.get(key) == 0:
+                continue
+            items, next_cursor = self._shard(key).history(user_id, limit, positions.get(key))
+            if items:
+                pages[key] = (items, next_cursor)
+
+        merged = heapq.merge(
+            *([(item.get("timestamp") or "", key, i) for i, item in enumerate(items)]
+              for key, (items, _) in pages.items()),
+            key=lambda t: t[0], reverse=True
+        )
+        taken = {}
+        result = []
+        for _, key, i in merged:
+            if len(result) == limit:
+                break
+            result.append(pages[key][0][i])
+            taken[key] = taken.get(key, 0) + 1
+
+        more = False
+        for key, (items, next_cursor) in pages.items():
+            k = taken.get(key, 0)
+            if k == 0:
+                more = True
+            elif k < len(items):
+                positions[key] = self._shard(key).history(user_id, k, positions.get(key))[1]
+                more = True
+            else:
+                positions[key] = next_cursor if next_cursor is not None else 0
+                more = more or next_cursor is not None
+
+        return result, (encode_cursor(positions) if more else None)
+
+    def scan(self, columns=None, **filters):
+        keys = self.keys(filters.get("state"), filters.get("city"))
+        if columns is not None:
+            # merged on it
+            columns = set(columns) | {"timestamp"}
+        return heapq.merge(*(self._shard(k).scan(columns, **filters) for k in keys),
+                           key=lambda e: e.get("timestamp") or "")
+
+    def tail(self, position=None, columns=None):
+        # Position is a {shard key: shard position} dict.
+        positions = dict(position) if isinstance(position, dict) else {}
+        for key in self.keys():
+            for entry, pos in self._shard(key).tail(positions.get(key, 0), columns):
+                positions[key] = pos
+                yield entry, dict(positions)
+
+    def __iter__(self):
+        return self.scan()
+
+    def close(self):
+        with self._lock:
+            for shard in self.shards.values():
+                shard.close()
+            self.shards = {}
@@ -0,0 +1,226 @@
+import json
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+from backend.tools.storage import HISTORY_PAGE_SIZE
+
+POOL_SIZE = int(os.environ.get("CIVICASSIST_SQLITE_POOL", "4"))
+# Rows per query for streaming reads; the connection goes back to the pool
+# between chunks, so slow consumers never hold one.
+READ_CHUNK = 500
+
+# Columns pulled out of the JSON record so filters and aggregates run in SQL.
+COLUMNS = ["complaint_id", "user_id", "complaint_text", "issue_type", "department",
+           "status", "state", "city", "timestamp"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS complaints (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    complaint_id TEXT UNIQUE,
+    user_id TEXT,
+    complaint_text TEXT,
+    issue_type TEXT,
+    department TEXT,
+    status TEXT,
+    state TEXT,
+    city TEXT,
+    timestamp TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_complaints_user ON complaints (user_id, seq);
+CREATE INDEX IF NOT EXISTS idx_complaints_location ON complaints (state, city);
+CREATE INDEX IF NOT EXISTS idx_complaints_issue ON complaints (issue_type);
+CREATE INDEX IF NOT EXISTS idx_complaints_department ON complaints (department);
+CREATE INDEX IF NOT EXISTS idx_complaints_status ON complaints (status);
+CREATE INDEX IF NOT EXISTS idx_complaints_timestamp ON complaints (timestamp);
+"""
+
+INSERT = ("INSERT OR IGNORE INTO complaints (complaint_id, user_id, complaint_text, issue_type, "
+          "department, status, state, city, timestamp, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+# analytics dimension -> its value for a row, as analytics.dimension_value
+# computes it from a record
+DIMENSION_SQL = {
+    "department": "COALESCE(NULLIF(department, ''), 'Unknown')",
+    "state": "COALESCE(NULLIF(state, ''), 'Unknown')",
+    "city": "COALESCE(NULLIF(city, ''), 'Unknown')",
+    "status": "COALESCE(NULLIF(status, ''), 'Unknown')",
+    "issue_type": "COALESCE(NULLIF(issue_type, ''), 'Unknown')",
+    "has_attachment": "CASE WHEN json_array_length(record, '$.attachments') > 0 "
+                      "THEN 'true' ELSE 'false' END"
+}
+DAY_SQL = "COALESCE(NULLIF(substr(timestamp, 1, 10), ''), 'unknown')"
+
+
+def _row(entry: dict) -> tuple:
+    return (
+        entry.get("complaint_id"),
+        entry.get("user_id"),
+        entry.get("complaint_text"),
+        (entry.get("classification") or {}).get("issue_type"),
+        (entry.get("department") or {}).get("name"),
+        entry.get("status"),
+        entry.get("state"),
+        entry.get("city"),
+        entry.get("timestamp"),
+        json.dumps(entry)
+    )
+
+
+def _where(filters: dict):
+    clauses, params = [], []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name == "since":
+            clauses.append("timestamp >= ?")
+        elif name == "until":
+            clauses.append("timestamp < ?")
+        elif name in COLUMNS:
+            clauses.append(f"{name} = ?")
+        else:
+            raise ValueError(f"Unknown filter: {name}")
+        params.append(value)
+
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class SqliteComplaintStore:
+    def __init__(self, path, pool_size=POOL_SIZE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                               isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def append(self, entry: dict):
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        rows = [_row(e) for e in entries]
+        if not rows:
+            return
+
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(INSERT, rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def import_log(self, log_path) -> int:
+        # One-shot import of the JSONL log when the database is first created.
+        # Rows stream from the file into a single transaction, so memory stays
+        # flat and an interrupted import leaves the table empty to retry.
+        if not os.path.exists(log_path):
+            return 0
+
+        def rows():
+            with open(log_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    yield _row(json.loads(line))
+
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT 1 FROM complaints LIMIT 1").fetchone():
+                    conn.execute("ROLLBACK")
+                    return 0
+                n = conn.executemany(INSERT, rows()).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return n
+
+    def daily_counts(self, dimensions):
+        # Aggregated in SQL: [(day, dimension, value, n)] plus the last seq
+        # they cover, read from one snapshot.
+        with self.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                last = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM complaints").fetchone()[0]
+                rows = []
+                for dimension in dimensions:
+                    rows += [(day, dimension, value, n) for day, value, n in conn.execute(
+                        f"SELECT {DAY_SQL}, {DIMENSION_SQL[dimension]}, COUNT(*) FROM complaints "
+                        "WHERE seq <= ? GROUP BY 1, 2", (last,))]
+            finally:
+                conn.execute("COMMIT")
+        return rows, last
+
+    def decode_cursor(self, cursor: str) -> int:
+        return int(cursor)
+
+    def history(self, user_id, limit=HISTORY_PAGE_SIZE, cursor=None):
+        sql = "SELECT seq, record FROM complaints WHERE user_id = ?"
+        params = [user_id]
+        if cursor is not None:
+            sql += " AND seq < ?"
+            params.append(cursor)
+        sql += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = rows[-1][0] if rows and more else None
+        return [json.loads(r[1]) for r in rows], next_cursor
+
+    def _chunks(self, filters: dict, after=0):
+        # (seq, record) rows past `after`, fetched READ_CHUNK at a time
+        where, params = _where(filters)
+        where = (where + " AND" if where else " WHERE") + " seq > ?"
+        sql = f"SELECT seq, record FROM complaints{where} ORDER BY seq LIMIT {READ_CHUNK}"
+        while True:
+            with self.connection() as conn:
+                rows = conn.execute(sql, params + [after]).fetchall()
+            yield from rows
+            if len(rows) < READ_CHUNK:
+                return
+            after = rows[-1][0]
+
+    def scan(self, columns=None, **filters):
+        # whole records always; `columns` only narrows the archive tier of
+        # the log store
+        for _, record in self._chunks(filters):
+            yield json.loads(record)
+
+    def tail(self, position=0, columns=None):
+        for seq, record in self._chunks({}, position):
+            yield json.loads(record), seq
+
+    def __iter__(self):
+        return self.scan()
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
@@ -0,0 +1,83 @@
+import bisect
+import json
+import os
+
+
+class UserIndex:
+    """Persistent user_id -> (offset, length) index over a complaint log.
+
+    Each line of the index file is ``[user_id, offset, length]``. The file is
+    only a startup shortcut: anything the log has beyond the last indexed
+    record is re-read with ``catch_up``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = {}
+        self.lengths = {}
+        self.end = 0
+        self._fh = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                user_id, offset, length = json.loads(line)
+                self._add(user_id, offset, length)
+
+    def _add(self, user_id, offset, length):
+        offsets = self.offsets.setdefault(user_id, [])
+        if offsets and offset <= offsets[-1]:
+            return
+        offsets.append(offset)
+        self.lengths.setdefault(user_id, []).append(length)
+        self.end = max(self.end, offset + length)
+
+    def record(self, user_id, offset, length):
+        if self._fh is None:
+            self._fh = open(self.path, "ab")
+        self._fh.write((json.dumps([user_id, offset, length]) + "\n").encode("utf-8"))
+        self._fh.flush()
+        self._add(user_id, offset, length)
+
+    def catch_up(self, log_path, persist=False, base=0):
+        # Index records appended by other workers (or before the index existed).
+        # Offsets are logical; the file starts at `base`.
+        start = max(self.end, base)
+        if not os.path.exists(log_path) or os.path.getsize(log_path) <= start - base:
+            return
+
+        with open(log_path, "rb") as f:
+            f.seek(start - base)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                user_id = json.loads(line).get("user_id")
+                if persist:
+                    self.record(user_id, offset, len(line))
+                else:
+                    self._add(user_id, offset, len(line))
+                offset += len(line)
+
+    def page(self, user_id, limit, before=None):
+        # Newest-first slice of (offset, length) pairs strictly older than `before`.
+        offsets = self.offsets.get(user_id, [])
+        lengths = self.lengths.get(user_id, [])
+
+        hi = len(offsets) if before is None else bisect.bisect_left(offsets, before)
+        lo = max(0, hi - limit)
+
+        refs = list(zip(offsets[lo:hi], lengths[lo:hi]))
+        refs.reverse()
+        return refs, (lo > 0)
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
@@ -0,0 +1,146 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from backend.tools import metrics, storage
+
+logger = logging.getLogger(__name__)
+
+# Most entries committed together, and how long the writer waits for more
+# once it has some (0: only what queued up during the previous commit).
+MAX_BATCH = int(os.environ.get("CIVICASSIST_GROUP_COMMIT_MAX", "512"))
+WINDOW = float(os.environ.get("CIVICASSIST_GROUP_COMMIT_MS", "0")) / 1000
+
+BATCH_SIZES = metrics.Histogram("civicassist_write_batch_size", "Entries per group commit.",
+                                buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+QUEUE_DEPTH = metrics.Histogram("civicassist_write_queue_depth",
+                                "Submissions waiting when a group commit starts.",
+                                buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128))
+
+
+class GroupCommitWriter:
+    """Single background thread that owns every complaint write in the process.
+
+    Requests submit entries and get a Future that resolves once the batch
+    holding them is fsynced to the log and mirrored to the CSV. Whatever
+    queues up while a commit is running goes out together in the next one,
+    so under load many requests share one write and one fsync. Workers in
+    other processes serialise on the log's file lock.
+    """
+
+    def __init__(self, commit=storage.save_entries, max_batch=MAX_BATCH, window=WINDOW):
+        self.commit = commit
+        self.max_batch = max_batch
+        self.window = window
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="complaint-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, entries) -> Future:
+        future = Future()
+        entries = list(entries)
+        if self._closed:
+            raise RuntimeError("writer is closed")
+        if not entries:
+            future.set_result(0)
+            return future
+        self._queue.put((entries, future))
+        return future
+
+    def write(self, entries) -> int:
+        return self.submit(entries).result()
+
+    def backlog(self) -> int:
+        # submissions waiting for a commit to pick them up
+        return self._queue.qsize()
+
+    def _take(self):
+        # Blocks for the first submission, then drains without waiting
+        # (or up to `window`) until the batch is full.
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        QUEUE_DEPTH.observe(self._queue.qsize())
+
+        batch, n = [first], len(first[0])
+        deadline = time.monotonic() + self.window
+        while n < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            n += len(item[0])
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stop = self._take()
+            if batch:
+                self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch, written=frozenset()):
+        # `written`: ids of this (single) submission already on disk from an
+        # earlier attempt
+        entries = [e for submitted, _ in batch for e in submitted]
+        try:
+            self.commit(entries)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.exception("Group commit of %d entries failed", len(entries))
+                done = set(written) | getattr(e, "written", set())
+                if done:
+                    # callers must not write these again
+                    e = storage.PartialAppend(done, e)
+                batch[0][1].set_exception(e)
+                return
+            # One bad submission must not fail everyone else's. Anything
+            # the store reports as already written is not sent again.
+            written = getattr(e, "written", set())
+            for submitted, future in batch:
+                ids = {entry.get("complaint_id") for entry in submitted}
+                rest = [entry for entry in submitted if entry.get("complaint_id") not in written]
+                if rest:
+                    self._commit([(rest, future)], ids & written)
+                else:
+                    future.set_result(len(submitted))
+            return
+
+        BATCH_SIZES.observe(len(entries))
+        for submitted, future in batch:
+            future.set_result(len(submitted))
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> GroupCommitWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter()
+    return _writer
+
+
+def close_writer():
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
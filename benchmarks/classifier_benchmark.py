@@ -0,0 +1,67 @@
+"""Keyword matcher vs hashed TF-IDF linear model on the repository's sample data.
+
+    python -m benchmarks.classifier_benchmark
+
+Accuracy is measured on a deterministic holdout (every 4th labelled
+example) of stored history + few-shot prompts; the ML model is trained on
+the rest. Note that stored history was itself labelled by the keyword
+heuristic, so it is an agreement score rather than ground truth.
+"""
+import json
+import time
+
+from backend.tools import ml_classifier
+from backend.tools.classifier import load_classifier
+
+SAMPLE_FILE = "agents/tests/sample_inputs.json"
+
+
+def throughput(fn, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(texts)
+    elapsed = time.perf_counter() - start
+    n = len(texts) * repeat
+    return {"items_per_s": round(n / elapsed), "us_per_item": round(elapsed / n * 1e6, 1)}
+
+
+def main():
+    keyword = load_classifier()
+    texts, labels = ml_classifier.training_data()
+
+    train_x = [t for i, t in enumerate(texts) if i % 4]
+    train_y = [l for i, l in enumerate(labels) if i % 4]
+    test = [(t, l) for i, (t, l) in enumerate(zip(texts, labels)) if not i % 4]
+
+    model = ml_classifier.LinearClassifier(ml_classifier.train(train_x, train_y))
+
+    def accuracy(clf):
+        hits = sum(clf.classify(t)["issue_type"] == keyword.labels.get(l, l) for t, l in test)
+        return round(hits / len(test), 3) if test else None
+
+    with open(SAMPLE_FILE, "r", encoding="utf-8") as f:
+        samples = json.load(f)
+    batch = samples * 500
+
+    report = {
+        "examples": {"train": len(train_x), "test": len(test)},
+        "keyword": {
+            "accuracy": accuracy(keyword),
+            "single": throughput(lambda ts: [keyword.classify(t) for t in ts], samples, 200),
+            "batch": throughput(keyword.classify_batch, batch, 3)
+        },
+        "ml": {
+            "accuracy": accuracy(model),
+            "single": throughput(lambda ts: [model.classify(t) for t in ts], samples, 200),
+            "batch": throughput(model.classify_batch, batch, 3)
+        },
+        "predictions": [
+            {"text": t, "keyword": keyword.classify(t)["issue_type"], "ml": model.classify(t)["issue_type"]}
+            for t in samples
+        ]
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Latency/throughput of the main endpoints plus pipeline micro-benchmarks.
+
+    python -m benchmarks.load_benchmark --store-size 100000 --concurrency 32
+    python -m benchmarks.load_benchmark --mode uvicorn --requests 2000
+    python -m benchmarks.load_benchmark --replay complaints.jsonl
+
+The store is pre-filled with synthetic complaints in a scratch memory dir
+(never backend/memory), then /agent/resolve, /agent/history/{user_id} and
+/memory/csv are driven at the given concurrency, either in-process through
+httpx's ASGI transport or over HTTP against a local uvicorn. Results are
+written as JSON (see --output) so runs can be compared across releases.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+SAMPLE_FILE = "agents/tests/sample_inputs.json"
+DEPARTMENTS_FILE = "backend/config/departments.json"
+USERS = 1000
+FILL_CHUNK = 10000
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def summarize(latencies, elapsed, errors):
+    ms = sorted(x * 1000 for x in latencies)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "throughput_rps": round(len(ms) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(ms, 50), 3) if ms else None,
+        "p95_ms": round(percentile(ms, 95), 3) if ms else None,
+        "p99_ms": round(percentile(ms, 99), 3) if ms else None,
+        "max_ms": round(ms[-1], 3) if ms else None
+    }
+
+
+def load_locations():
+    with open(DEPARTMENTS_FILE, "r", encoding="utf-8") as f:
+        locations = json.load(f).get("locations", {})
+    return [(state, city) for state, cities in locations.items() for city in cities]
+
+
+def synthetic_complaints(n, rng, locations, texts):
+    for _ in range(n):
+        state, city = rng.choice(locations)
+        yield {
+            "user_id": f"u{rng.randrange(USERS)}",
+            "complaint_text": f"{rng.choice(texts)} Near landmark {rng.randrange(500)}.",
+            "state": state,
+            "city": city,
+            "attachments": []
+        }
+
+
+def replayed_complaints(path, rng, locations):
+    # Any JSONL whose records carry complaint text; missing fields are filled in.
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            if isinstance(rec, str):
+                rec = {"complaint_text": rec}
+            text = rec.get("complaint_text") or rec.get("text") or rec.get("body")
+            if not text:
+                continue
+            state, city = rng.choice(locations)
+            out.append({
+                "user_id": rec.get("user_id") or f"u{rng.randrange(USERS)}",
+                "complaint_text": text,
+                "state": rec.get("state") or state,
+                "city": rec.get("city") or city,
+                "attachments": []
+            })
+    return out
+
+
+def fill_store(n, rng, locations, texts):
+    # Straight through the storage layer; going over HTTP would take hours at 1M.
+    from backend.tools import classifier, department_lookup, storage
+
+    keyword = classifier.get_keyword_classifier()
+    registry = department_lookup.get_registry()
+    start = time.perf_counter()
+    base = datetime.datetime.utcnow() - datetime.timedelta(days=365)
+
+    done = 0
+    while done < n:
+        chunk = list(synthetic_complaints(min(FILL_CHUNK, n - done), rng, locations, texts))
+        entries = []
+        for i, (c, cls) in enumerate(zip(chunk, keyword.classify_batch([c["complaint_text"] for c in chunk]))):
+            department, plan = registry.lookup(cls["issue_type"], c["state"], c["city"])
+            entries.append(dict(
+                c,
+                complaint_id=f"c-bench-{done + i}",
+                classification=cls,
+                department=department,
+                action_plan=plan,
+                status="Pending",
+                timestamp=(base + datetime.timedelta(seconds=(done + i) * 365 * 86400 // n)).isoformat()
+            ))
+        storage.save_entries(entries)
+        done += len(entries)
+
+    storage.close_store()
+    return round(time.perf_counter() - start, 2)
+
+
+async def drive(client, make_request, total, concurrency):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            method, url, kwargs = make_request(i)
+            t = time.perf_counter()
+            try:
+                r = await client.request(method, url, **kwargs)
+                await r.aread()
+                if r.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+async def run_endpoints(client, args, complaints, rng, locations):
+    # The server builds the derived indexes at startup; these first requests
+    # keep whatever else is lazy (caches, connections) out of the numbers.
+    start = time.perf_counter()
+    await client.post("/agent/resolve", json=complaints[0])
+    await client.get("/complaints/search", params={"q": "water"})
+    results = {"warmup_seconds": round(time.perf_counter() - start, 2)}
+    results["resolve"] = await drive(
+        client, lambda i: ("POST", "/agent/resolve", {"json": complaints[i % len(complaints)]}),
+        args.requests, args.concurrency
+    )
+    results["history"] = await drive(
+        client, lambda i: ("GET", f"/agent/history/u{rng.randrange(USERS)}", {}),
+        args.requests, args.concurrency
+    )
+
+    def csv_request(i):
+        state, city = rng.choice(locations)
+        params = {} if args.csv_full else {"state": state, "city": city}
+        return "GET", "/memory/csv", {"params": params}
+
+    results["csv"] = await drive(client, csv_request, args.csv_requests, min(args.concurrency, 4))
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_uvicorn(args, complaints, rng, locations):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=dict(os.environ)
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            for _ in range(200):
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not start")
+            return await run_endpoints(client, args, complaints, rng, locations)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+async def run_inprocess(args, complaints, rng, locations):
+    from backend.main import app, load_indexes
+
+    # ASGITransport sends no lifespan events, so the startup hook never runs
+    load_indexes()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        return await run_endpoints(client, args, complaints, rng, locations)
+
+
+def micro(fn, args_list, seconds=1.0):
+    # Calls fn over args_list in a loop for about `seconds`.
+    n = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for a in args_list:
+            fn(*a)
+        n += len(args_list)
+    elapsed = time.perf_counter() - start
+    return {"calls": n, "ops_per_s": round(n / elapsed), "us_per_call": round(elapsed / n * 1e6, 2)}
+
+
+def micro_benchmarks(texts, locations):
+    from backend import main
+
+    classifications = [main.simple_classify(t) for t in texts]
+    places = [locations[i % len(locations)] for i in range(len(texts))]
+    return {
+        "simple_classify": micro(main.simple_classify, [(t,) for t in texts]),
+        "simple_map_department": micro(main.simple_map_department,
+                                       [(c, s, ct) for c, (s, ct) in zip(classifications, places)]),
+        "simple_plan": micro(main.simple_plan,
+                             [(c, s, ct) for c, (s, ct) in zip(classifications, places)])
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--store-size", type=int, default=1000,
+                        help="synthetic records in the store before measuring (e.g. 1000, 100000, 1000000)")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--csv-requests", type=int, default=20)
+    parser.add_argument("--csv-full", action="store_true", help="export everything instead of one city")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--replay", help="JSONL of complaints to submit instead of synthetic ones")
+    parser.add_argument("--memory-dir", help="scratch memory dir (default: a new temp dir)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    # Must be set before anything imports backend.tools.storage.
+    memory_dir = args.memory_dir or tempfile.mkdtemp(prefix="civicassist-bench-")
+    os.environ["CIVICASSIST_MEMORY_DIR"] = memory_dir
+    # Measure the pipeline, not 429s; set these explicitly to benchmark the limits.
+    os.environ.setdefault("CIVICASSIST_USER_RATE", "0")
+    os.environ.setdefault("CIVICASSIST_CITY_RATE", "0")
+
+    rng = random.Random(args.seed)
+    locations = load_locations()
+    with open(SAMPLE_FILE, "r", encoding="utf-8") as f:
+        texts = json.load(f)
+
+    fill_seconds = fill_store(args.store_size, rng, locations, texts)
+
+    if args.replay:
+        complaints = replayed_complaints(args.replay, rng, locations)
+    else:
+        complaints = list(synthetic_complaints(args.requests, rng, locations, texts))
+
+    run = run_uvicorn if args.mode == "uvicorn" else run_inprocess
+    endpoints = asyncio.run(run(args, complaints, rng, locations))
+
+    report = {
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "store": {
+            "kind": os.environ.get("CIVICASSIST_STORE", "log"),
+            "shard_by": os.environ.get("CIVICASSIST_SHARD_BY", ""),
+            "memory_dir": memory_dir,
+            "fill_seconds": fill_seconds
+        },
+        "endpoints": endpoints,
+        "micro": None if args.skip_micro else micro_benchmarks(texts, locations)
+    }
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    print(f"saved {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# backend.tools.storage reads these at import time, so they are set before
+# any test module imports the backend; tests never touch backend/memory.
+os.environ["CIVICASSIST_MEMORY_DIR"] = tempfile.mkdtemp(prefix="civicassist-test-")
+os.environ.setdefault("CIVICASSIST_ATTACHMENT_WORKERS", "0")
@@ -0,0 +1,75 @@
+import pytest
+
+from backend.tools import admission
+
+
+def test_burst_then_refill():
+    buckets = admission.TokenBuckets(rate_per_minute=60, burst=3)
+    assert [buckets.take("u", now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+
+    # empty: one token a second
+    assert buckets.take("u", now=0.0) == pytest.approx(1.0)
+    assert buckets.take("u", now=0.25) == pytest.approx(0.75)
+    assert buckets.take("u", now=1.0) == 0.0
+
+    # refills up to the burst and no further
+    assert [buckets.take("u", now=100.0) for _ in range(4)][:3] == [0.0, 0.0, 0.0]
+    assert buckets.take("u", now=100.0) > 0
+
+
+def test_buckets_are_per_key():
+    buckets = admission.TokenBuckets(rate_per_minute=6, burst=1)
+    assert buckets.take("a", now=0.0) == 0.0
+    assert buckets.take("a", now=0.0) == pytest.approx(10.0)
+    assert buckets.take("b", now=0.0) == 0.0
+
+
+def test_zero_rate_is_off():
+    buckets = admission.TokenBuckets(rate_per_minute=0, burst=0)
+    assert all(buckets.take("u", now=0.0) == 0.0 for _ in range(100))
+    assert buckets.buckets == {}
+
+
+def test_idle_buckets_are_pruned(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_BUCKETS", 2)
+    buckets = admission.TokenBuckets(rate_per_minute=60, burst=2)
+    buckets.take("a", now=0.0)
+    buckets.take("b", now=5.0)
+    buckets.take("c", now=5.5)
+    assert set(buckets.buckets) == {"b", "c"}
+
+
+@pytest.mark.parametrize("seconds, header", [(0.01, "1"), (1.0, "1"), (1.2, "2"), (29.5, "30")])
+def test_retry_after(seconds, header):
+    assert admission.retry_after(seconds) == header
+
+
+def test_city_limit_after_user_limit():
+    controller = admission.AdmissionController()
+    controller.users = admission.TokenBuckets(rate_per_minute=60, burst=5)
+    controller.cities = admission.TokenBuckets(rate_per_minute=60, burst=1)
+    assert controller.check("u1", "Kerala", "Kochi") == 0.0
+    assert controller.check("u2", "Kerala", "Kochi") > 0
+    assert controller.check("u3", "Kerala", "Kollam") == 0.0
+    assert controller.check("u4") == 0.0
+
+
+def test_resolve_returns_429_with_retry_after(monkeypatch):
+    from starlette.testclient import TestClient
+
+    from backend.main import app
+
+    controller = admission.AdmissionController()
+    controller.users = admission.TokenBuckets(rate_per_minute=2, burst=1)
+    monkeypatch.setattr(admission, "_controller", controller)
+
+    with TestClient(app) as client:
+        def resolve(text):
+            return client.post("/agent/resolve", json={"user_id": "rate", "complaint_text": text,
+                                                       "state": "Karnataka", "city": "Bengaluru"})
+
+        assert resolve("Streetlight broken on 4th cross").status_code == 200
+        r = resolve("Garbage not collected for a week")
+        assert r.status_code == 429
+        # one token every 30 seconds
+        assert r.headers["Retry-After"] == "30"
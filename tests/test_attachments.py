@@ -0,0 +1,66 @@
+import pytest
+from starlette.testclient import TestClient
+
+from backend.main import app
+from backend.tools import blobs
+
+DATA = bytes(range(256)) * 4
+
+
+@pytest.fixture(scope="module")
+def blob():
+    client = TestClient(app)
+    meta = blobs.put_bytes(DATA, "data.bin")
+    return client, f"/attachments/{meta['id']}", f'"{meta["id"]}"'
+
+
+def get(blob, **headers):
+    client, url, _ = blob
+    return client.get(url, headers=headers)
+
+
+def test_whole_blob(blob):
+    r = get(blob)
+    assert r.status_code == 200
+    assert r.content == DATA
+    assert r.headers["accept-ranges"] == "bytes"
+    assert r.headers["content-length"] == str(len(DATA))
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-9", 0, 9),
+    ("bytes=1000-", 1000, 1023),        # open-ended
+    ("bytes=-24", 1000, 1023),          # suffix
+    ("bytes=-5000", 0, 1023),           # suffix longer than the blob
+    ("bytes=1020-5000", 1020, 1023),    # end past the blob is clamped
+])
+def test_ranges(blob, header, start, end):
+    r = get(blob, range=header)
+    assert r.status_code == 206
+    assert r.content == DATA[start:end + 1]
+    assert r.headers["content-range"] == f"bytes {start}-{end}/{len(DATA)}"
+    assert r.headers["content-length"] == str(end - start + 1)
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=10-5", "bytes=-0", "bytes=a-b", "bytes=-"])
+def test_unsatisfiable_range(blob, header):
+    r = get(blob, range=header)
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+def test_multiple_ranges_get_the_whole_blob(blob):
+    r = get(blob, range="bytes=0-1,5-6")
+    assert r.status_code == 200
+    assert r.content == DATA
+
+
+def test_if_none_match(blob):
+    etag = blob[2]
+    assert get(blob, **{"if-none-match": etag}).status_code == 304
+    assert get(blob, **{"if-none-match": f'"other", {etag}'}).status_code == 304
+    assert get(blob, **{"if-none-match": '"other"'}).status_code == 200
+
+
+def test_missing_blob():
+    assert TestClient(app).get("/attachments/" + "0" * 64).status_code == 404
@@ -0,0 +1,67 @@
+import pytest
+
+from backend.tools import department_lookup, escalation
+
+
+@pytest.mark.parametrize("estimate, hours", [
+    ("48-72 hours", 72),
+    ("24-48 hours", 48),
+    ("24-72 hours", 72),
+    ("7-14 days", 336),
+    ("72+ hours", 72),
+    ("1 day", 24),
+    ("1.5 days", 36),
+    ("12 hrs", 12),
+    ("6h", 6),
+    ("within 10 hours", 10),
+    ("", escalation.DEFAULT_HOURS),
+    ("as soon as possible", escalation.DEFAULT_HOURS),
+])
+def test_estimated_resolution_time(estimate, hours):
+    assert escalation.escalate_after({"estimated_resolution_time": estimate}) == hours
+
+
+@pytest.mark.parametrize("step, hours", [
+    ("If unresolved in 48 hours, escalate.", 48),
+    ("Escalate after 24 hours.", 24),
+    ("Escalate if not cleared in 48 hours.", 48),
+    ("Escalate if not repaired in 72 hours.", 72),
+    ("Follow up after 72 hours.", 72),
+    ("Follow-up in 2 days, then escalate after 5 days.", 48),
+])
+def test_escalation_step_wins_over_estimate(step, hours):
+    plan = {"steps": ["Take a photo.", step], "estimated_resolution_time": "7-14 days"}
+    assert escalation.escalate_after(plan) == hours
+
+
+def test_step_without_a_time_falls_back_to_estimate():
+    plan = {"steps": ["Escalate for urgent repairs if safety risk."],
+            "estimated_resolution_time": "7-14 days"}
+    assert escalation.escalate_after(plan) == 336
+
+
+def test_every_configured_plan_has_a_parsed_deadline():
+    registry = department_lookup.get_registry()
+    plans = [plan for _, plan in registry.table.values()] + [registry.default[1]]
+    for plan in plans:
+        # a format the parser does not know would fall through to the default
+        if plan.get("estimated_resolution_time"):
+            assert escalation._hours(plan["estimated_resolution_time"]), plan
+        assert escalation.escalate_after(plan) > 0
+
+
+def test_due_time():
+    plan = {"steps": ["Escalate after 24 hours."]}
+    assert escalation.due_time(plan, "2026-01-01T10:00:00") == "2026-01-02T10:00:00"
+    assert escalation.due_time({}, "2026-01-01T10:00:00") == "2026-01-04T10:00:00"
+
+
+def test_scheduler_restarts_after_shutdown():
+    first = escalation.get_scheduler()
+    escalation.close_scheduler()
+    second = escalation.get_scheduler()
+    try:
+        assert second is not first
+        assert not second._stop.is_set()
+    finally:
+        escalation.close_scheduler()
@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+from backend.tools import lifecycle
+
+
+class Store:
+    # stands in for the complaint store: tail() over an in-memory list
+    def __init__(self, n=0):
+        self.rows = []
+        for i in range(n):
+            self.add(f"c{i}")
+
+    def add(self, cid):
+        self.rows.append({"complaint_id": cid, "department": {"name": "Water Board"},
+                          "timestamp": "2026-01-01T10:00:00"})
+
+    def tail(self, position=0, columns=None):
+        for i, entry in enumerate(self.rows[position:], position + 1):
+            yield entry, i
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "status_events.jsonl"), str(tmp_path / "status_view.json")
+
+
+def rebuilt(paths, store):
+    # the view folded from the logs alone, no checkpoint
+    events, snapshot = paths
+    view = lifecycle.StatusView(events, snapshot + ".none")
+    view.refresh(store)
+    return view
+
+
+def test_transitions(paths):
+    store = Store(1)
+    view = lifecycle.StatusView(*paths)
+    view.refresh(store)
+
+    assert view.get("c0") == "Pending"
+    assert view.update("c0", "In Progress", store=store)["previous"] == "Pending"
+    view.update("c0", "Resolved", store=store)
+    with pytest.raises(lifecycle.InvalidTransition):
+        view.update("c0", "Pending", store=store)
+    with pytest.raises(lifecycle.InvalidTransition):
+        view.update("c0", "Done", store=store)
+    with pytest.raises(KeyError):
+        view.update("c-missing", "Resolved", store=store)
+    assert view.summary()["by_status"] == {"Resolved": 1}
+
+
+def test_status_endpoint_rejects_invalid_transitions():
+    from starlette.testclient import TestClient
+
+    from backend.main import app
+
+    with TestClient(app) as client:
+        cid = client.post("/agent/resolve", json={"user_id": "status", "complaint_text": "Streetlight broken",
+                                                  "state": "Karnataka", "city": "Bengaluru"}).json()["complaint_id"]
+        url = f"/complaints/{cid}/status"
+
+        assert client.patch(url, json={"status": "Resolved"}).status_code == 200
+        assert client.patch(url, json={"status": "Pending"}).status_code == 409
+        assert client.patch(url, json={"status": "Resolved"}).status_code == 409
+        assert client.patch(url, json={"status": "Done"}).status_code == 400
+        assert client.patch("/complaints/c-missing/status", json={"status": "Resolved"}).status_code == 404
+
+
+def test_event_before_its_complaint_is_kept(paths):
+    store = Store(1)
+    view = lifecycle.StatusView(*paths)
+    view.refresh(store)
+
+    # another worker stores c1 and moves it on between this view's store
+    # read and its event read
+    with open(paths[0], "ab") as f:
+        f.write((json.dumps({"complaint_id": "c1", "status": "In Progress"}) + "\n").encode())
+    view.refresh(Store(0))
+    assert view.orphans == {"c1": "In Progress"}
+
+    store.add("c1")
+    view.refresh(store)
+    assert view.get("c1") == "In Progress"
+    assert view.orphans == {}
+    assert view.counts == rebuilt(paths, store).counts
+
+
+def test_reload_after_crash_between_delta_and_head(paths, monkeypatch):
+    store = Store(10)
+    view = lifecycle.StatusView(*paths)
+    view.refresh(store)
+    view.flush()
+    for i in range(5):
+        view.update(f"c{i}", "In Progress", store=store)
+
+    head = view.head
+    write_json = lifecycle.StatusView._write_json
+
+    def crash(self, path, data):
+        if path == head:
+            raise OSError("killed")
+        write_json(self, path, data)
+
+    monkeypatch.setattr(lifecycle.StatusView, "_write_json", crash)
+    with pytest.raises(OSError):
+        view.flush()
+    monkeypatch.undo()
+
+    reloaded = lifecycle.StatusView(*paths)
+    assert reloaded.position == view.position
+    assert reloaded.current == view.current
+    assert {k: n for k, n in reloaded.counts.items() if n} == \
+        {k: n for k, n in view.counts.items() if n}
+
+    # the stale head still lets the chain grow, and it stays consistent
+    reloaded.update("c7", "Resolved", store=store)
+    reloaded.flush()
+    again = lifecycle.StatusView(*paths)
+    assert again.current == rebuilt(paths, store).current
+
+
+def test_torn_delta_is_ignored(paths):
+    store = Store(3)
+    view = lifecycle.StatusView(*paths)
+    view.refresh(store)
+    view.flush()
+    view.update("c0", "Resolved", store=store)
+    view.flush()
+    with open(view.deltas, "ab") as f:
+        f.write(b'{"generation": ')
+
+    reloaded = lifecycle.StatusView(*paths)
+    assert reloaded.current == view.current
+    reloaded.refresh(store)
+    assert reloaded.current == rebuilt(paths, store).current
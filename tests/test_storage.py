@@ -0,0 +1,111 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from backend.tools import storage
+
+
+def entry(i, user_id="u1", timestamp=None):
+    return {"complaint_id": f"c-{i}", "user_id": user_id, "complaint_text": f"complaint {i}",
+            "state": "Karnataka", "city": "Bengaluru",
+            "timestamp": timestamp or f"2026-01-01T00:00:{i:02d}"}
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = storage.ComplaintLog(str(tmp_path / "complaints.jsonl"))
+    yield log
+    log.close()
+
+
+def test_fresh_log_is_empty(log):
+    assert log.history("u1") == ([], None)
+    assert list(log.tail()) == []
+
+
+def test_history_pages_newest_first(log):
+    log.append_many([entry(i, "u1" if i % 2 else "u2") for i in range(10)])
+    log.append(entry(10))
+
+    page, cursor = log.history("u1", limit=3)
+    assert [e["complaint_id"] for e in page] == ["c-10", "c-9", "c-7"]
+    rest, cursor = log.history("u1", limit=10, cursor=cursor)
+    assert [e["complaint_id"] for e in rest] == ["c-5", "c-3", "c-1"]
+    assert cursor is None
+    assert log.history("nobody") == ([], None)
+
+
+def test_tail_resumes_from_position(log):
+    log.append_many([entry(i) for i in range(3)])
+    seen = list(log.tail())
+    assert [e["complaint_id"] for e, _ in seen] == ["c-0", "c-1", "c-2"]
+
+    log.append(entry(3))
+    assert [e["complaint_id"] for e, _ in log.tail(seen[-1][1])] == ["c-3"]
+
+
+def test_compact_keeps_offsets_and_history(log):
+    pytest.importorskip("pyarrow")
+    old = [entry(i, timestamp=f"2020-01-01T00:00:{i:02d}") for i in range(5)]
+    recent = [entry(i) for i in range(5, 8)]
+    log.append_many(old + recent)
+    tailed = list(log.tail())
+    history = log.history("u1", limit=100)
+
+    assert log.compact("2021-01-01") == 5
+    assert log.base > 0
+    assert list(log.tail()) == tailed
+    assert log.history("u1", limit=100) == history
+    assert [e["complaint_id"] for e in log.scan()] == [f"c-{i}" for i in range(8)]
+
+    reopened = storage.ComplaintLog(log.path)
+    try:
+        assert reopened.base == log.base
+        assert reopened.history("u1", limit=100) == history
+    finally:
+        reopened.close()
+
+
+def test_archive_reads_only_the_columns_asked_for(log):
+    pytest.importorskip("pyarrow")
+    old = [dict(entry(i, timestamp=f"2020-01-01T00:00:{i:02d}"),
+                classification={"issue_type": "Water supply", "confidence": 0.9},
+                department={"name": "Water Board"}, status=None,
+                attachments=[{"id": f"b{i}", "filename": "x.jpg"}] if i % 2 else [])
+           for i in range(4)]
+    log.append_many(old)
+    log.compact("2021-01-01")
+
+    assert list(log.scan()) == old
+    columns = ["complaint_id", "issue_type", "department", "attachments", "status"]
+    projected = list(log.scan(columns, department="Water Board"))
+    assert [[storage.entry_field(e, c) for c in columns] for e in projected] == \
+        [[storage.entry_field(e, c) for c in columns] for e in old]
+    assert "complaint_text" not in projected[0]
+
+
+FRESH_DIR_SCRIPT = """
+from starlette.testclient import TestClient
+from backend.main import app
+
+with TestClient(app) as client:
+    r = client.post("/agent/resolve", json={"user_id": "fresh", "complaint_text": "No water for 3 days",
+                                            "state": "Karnataka", "city": "Bengaluru"})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["memory_saved"] is True
+
+    history = client.get("/agent/history/fresh").json()["history"]
+    assert [h["complaint_id"] for h in history] == [body["complaint_id"]]
+    assert body["complaint_id"] in client.get("/memory/csv").text
+"""
+
+
+def test_resolve_on_a_fresh_memory_dir(tmp_path):
+    # In its own process: MEMORY_DIR is read at import time, and other
+    # tests have already written to this session's.
+    env = dict(os.environ, CIVICASSIST_MEMORY_DIR=str(tmp_path / "memory"))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", FRESH_DIR_SCRIPT], env=env, cwd=root, check=True)
@@ -0,0 +1,98 @@
+import os
+import time
+
+import pytest
+
+from backend.tools import storage, writer
+
+
+def entries(*ids):
+    return [{"complaint_id": cid} for cid in ids]
+
+
+def test_partial_group_commit_retries_only_unwritten_entries():
+    calls = []
+
+    def commit(batch):
+        ids = [e["complaint_id"] for e in batch]
+        calls.append(ids)
+        if "bad" in ids:
+            # everything before the bad entry made it to disk
+            written = ids[:ids.index("bad")]
+            if written:
+                raise storage.PartialAppend(written, OSError("disk full"))
+            raise OSError("disk full")
+
+    w = writer.GroupCommitWriter(commit=commit, window=0.5)
+    try:
+        a = w.submit(entries("a1", "a2"))
+        b = w.submit(entries("b1", "bad", "b2"))
+        c = w.submit(entries("c1"))
+
+        assert a.result(timeout=5) == 2
+        assert c.result(timeout=5) == 1
+        with pytest.raises(storage.PartialAppend) as e:
+            b.result(timeout=5)
+        # b1 went out with the group and must not be written again
+        assert e.value.written == {"b1"}
+    finally:
+        w.close()
+
+    assert calls == [["a1", "a2", "b1", "bad", "b2", "c1"], ["bad", "b2"], ["c1"]]
+
+
+def test_failed_submission_alone_keeps_its_error():
+    def commit(batch):
+        raise OSError("disk full")
+
+    w = writer.GroupCommitWriter(commit=commit)
+    try:
+        with pytest.raises(OSError):
+            w.write(entries("x"))
+    finally:
+        w.close()
+
+
+@pytest.fixture
+def fsyncs(monkeypatch):
+    synced = []
+    fsync = os.fsync
+
+    def recording(fd):
+        synced.append(fd)
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", recording)
+    return synced
+
+
+def test_fsync_after_every_n_appends(tmp_path, monkeypatch, fsyncs):
+    monkeypatch.setattr(storage, "FSYNC_EVERY", 2)
+    monkeypatch.setattr(storage, "FSYNC_INTERVAL", 60.0)
+    log = storage.ComplaintLog(str(tmp_path / "complaints.jsonl"))
+    try:
+        log.append({"complaint_id": "c1"})
+        assert log._unsynced == 1
+        log.append({"complaint_id": "c2"})
+        assert log._unsynced == 0
+        assert fsyncs
+    finally:
+        log.close()
+
+
+def test_quiet_log_is_synced_within_the_interval(tmp_path, monkeypatch, fsyncs):
+    monkeypatch.setattr(storage, "FSYNC_EVERY", 1000)
+    monkeypatch.setattr(storage, "FSYNC_INTERVAL", 0.1)
+    log = storage.ComplaintLog(str(tmp_path / "complaints.jsonl"))
+    try:
+        log.append({"complaint_id": "c1"})
+        assert log._unsynced == 1
+
+        # no further appends: the timer has to do it
+        deadline = time.monotonic() + 5
+        while log._unsynced and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert log._unsynced == 0
+        assert fsyncs
+    finally:
+        log.close()
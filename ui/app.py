@@ -1,9 +1,11 @@
 import streamlit as st
-import requests
 import base64
 from datetime import datetime
+from io import StringIO
 import pandas as pd
 
+import client
+
 st.set_page_config(page_title="CivicAssist", layout="centered")
 
 # ---------------- HEADER -----------------
@@ -19,7 +21,7 @@ st.markdown(
 # ---------------- SIDEBAR ----------------
 st.sidebar.markdown("---")
 st.sidebar.header("⚙️ Settings")
-backend_url = st.sidebar.text_input("Backend URL", "https://civicassist-capstone-project-1.onrender.com")
+backend_url = st.sidebar.text_input("Backend URL", client.DEFAULT_BACKEND_URL)
 
 # -------- Helper: status badge HTML -------
 def status_badge_html(status: str) -> str:
@@ -69,9 +71,6 @@ if uploaded_image:
     st.image(uploaded_image, caption="Uploaded Image Preview", width=250)
 
 
-attachment_b64 = None
-if uploaded_image:
-    attachment_b64 = base64.b64encode(uploaded_image.read()).decode("utf-8")
 
 with st.form("complaint_form"):
     user_id = st.text_input("User ID", value="user1")
@@ -83,19 +82,22 @@ if submitted:
         st.error("⚠️ Please enter a complaint before submitting.")
     else:
 
-        payload = {
-            "user_id": user_id,
-            "complaint_text": complaint_text,
-            "state": state,
-            "city": city,
-            "attachments": [attachment_b64] if attachment_b64 else []
-        }
-
         try:
             with st.spinner("Processing your complaint..."):
-                resp = requests.post(f"{backend_url}/agent/resolve", json=payload)
-                resp.raise_for_status()
-                result = resp.json()
+                attachments = []
+                if uploaded_image:
+                    # multipart upload streams the raw bytes, no base64 overhead
+                    attachments.append(client.upload_attachment(backend_url, uploaded_image)["id"])
+
+                payload = {
+                    "user_id": user_id,
+                    "complaint_text": complaint_text,
+                    "state": state,
+                    "city": city,
+                    "attachments": attachments
+                }
+
+                result = client.resolve(backend_url, payload)
 
             st.success("🎉 Complaint processed successfully!")
 
@@ -161,69 +163,99 @@ st.subheader("📚 Complaint History")
 
 hist_user = st.text_input("User ID for history", "user1", key="history")
 
+
+def load_history_page():
+    # One page per click; earlier pages stay in session state across reruns.
+    page = client.history_page(backend_url, hist_user, st.session_state.hist_cursor)
+    st.session_state.hist_items.extend(page.get("history", []))
+    st.session_state.hist_cursor = page.get("next_cursor")
+
+
 if st.button("Get History"):
+    st.session_state.hist_owner = (backend_url, hist_user)
+    st.session_state.hist_items = []
+    st.session_state.hist_cursor = None
     try:
-        r = requests.get(f"{backend_url}/agent/history/{hist_user}")
-
-        if r.status_code == 200:
-            history = r.json().get("history", [])
-
-            if not history:
-                st.info("ℹ️ No complaints found for this user.")
-            else:
-                st.markdown("### 📜 Past Complaints")
-
-                is_dark = st.get_option("theme.base") == "dark"
-                card_bg = "#1e1e1e" if is_dark else "#f7f7f7"
-                card_border = "#444" if is_dark else "#ddd"
-                text_color = "#fff" if is_dark else "#000"
-
-                for item in history:
-                    stat = item.get("status", "Pending")
-                    badge_html = status_badge_html(stat)
-
-                    st.markdown(
-                        f"""
-                        <div style="
-                            padding:15px;
-                            margin-bottom:14px;
-                            border-radius:10px;
-                            background:{card_bg};
-                            border:1px solid {card_border};
-                            color:{text_color};
-                        ">
-                            <b>🆔 Complaint ID:</b> {item.get('complaint_id')}<br>
-                            <b>📝 Complaint:</b> {item.get('complaint_text')}<br>
-                            <b>🏷 Issue:</b> {item.get('classification', {}).get('issue_type')}<br>
-                            <b>🏛 Department:</b> {item.get('department', {}).get('name')}<br>
-                            <b>📌 Status:</b> {badge_html}<br>
-                            <b>📅 Timestamp:</b> {item.get('timestamp')}
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-
-                    # ---- IMAGE PREVIEW ----
-                    if item.get("attachments"):
-                        st.markdown("📷 **Attached Image:**")
-                        for img_b64 in item["attachments"]:
-                            st.image(base64.b64decode(img_b64), width=120)
+        load_history_page()
+    except client.BackendError as e:
+        st.session_state.hist_owner = None
+        st.error(f"❌ Could not fetch history from backend: {e}")
 
-        else:
-            st.error("❌ Could not fetch history from backend.")
-    except Exception as e:
-        st.error(f"❌ Error: {e}")
+if st.session_state.get("hist_owner") == (backend_url, hist_user):
+    history = st.session_state.hist_items
+
+    if not history:
+        st.info("ℹ️ No complaints found for this user.")
+    else:
+        st.markdown("### 📜 Past Complaints")
+
+        is_dark = st.get_option("theme.base") == "dark"
+        card_bg = "#1e1e1e" if is_dark else "#f7f7f7"
+        card_border = "#444" if is_dark else "#ddd"
+        text_color = "#fff" if is_dark else "#000"
+
+        for item in history:
+            stat = item.get("status", "Pending")
+            badge_html = status_badge_html(stat)
+
+            st.markdown(
+                f"""
+                <div style="
+                    padding:15px;
+                    margin-bottom:14px;
+                    border-radius:10px;
+                    background:{card_bg};
+                    border:1px solid {card_border};
+                    color:{text_color};
+                ">
+                    <b>🆔 Complaint ID:</b> {item.get('complaint_id')}<br>
+                    <b>📝 Complaint:</b> {item.get('complaint_text')}<br>
+                    <b>🏷 Issue:</b> {item.get('classification', {}).get('issue_type')}<br>
+                    <b>🏛 Department:</b> {item.get('department', {}).get('name')}<br>
+                    <b>📌 Status:</b> {badge_html}<br>
+                    <b>📅 Timestamp:</b> {item.get('timestamp')}
+                </div>
+                """,
+                unsafe_allow_html=True
+            )
+
+            # ---- IMAGE PREVIEW ----
+            # the browser fetches these itself, only for the cards on screen
+            if item.get("attachments"):
+                st.markdown("📷 **Attached Image:**")
+                for att in item["attachments"]:
+                    if isinstance(att, dict) and att.get("id"):
+                        if att.get("processed") is False:
+                            st.caption("Image is still being processed.")
+                        else:
+                            st.image(client.attachment_url(backend_url, att), width=120)
+                    elif isinstance(att, str):
+                        try:
+                            st.image(base64.b64decode(att), width=120)
+                        except Exception:
+                            st.caption(att)
+
+        if st.session_state.hist_cursor and st.button("Load more"):
+            try:
+                load_history_page()
+                st.rerun()
+            except client.BackendError as e:
+                st.error(f"❌ Error: {e}")
 
 if st.button("⬇️ Download CSV"):
-    csv_url = f"{backend_url}/memory/csv"
-    csv_data = requests.get(csv_url).text
+    try:
+        csv_data = client.complaints_csv(backend_url)
+    except client.BackendError as e:
+        st.error(f"❌ Error: {e}")
+        csv_data = None
 
-    if not csv_data.strip():
+    if csv_data is not None and not csv_data.strip():
         st.info("No complaint data available yet.")
-    else:
-        from io import StringIO
+    elif csv_data is not None:
         df = pd.read_csv(StringIO(csv_data))
         st.dataframe(df)
+        st.download_button("Save complaints.csv", csv_data, file_name="complaints.csv",
+                           mime="text/csv")
 
 
 
@@ -233,37 +265,28 @@ st.subheader("📊 Analytics Dashboard")
 
 if st.button("Show Dashboard"):
     try:
-        csv_url = f"{backend_url}/memory/csv"
-        csv_data = requests.get(csv_url).text
+        summary = client.analytics_summary(backend_url)
 
-        if not csv_data.strip():
-            st.info("No complaint data available yet.")
-        else:
-            from io import StringIO
-            df = pd.read_csv(StringIO(csv_data))
-        if df.empty:
+        if not summary.get("total"):
             st.info("No complaint data available yet.")
         else:
+            by = summary.get("by", {})
+
             st.markdown("### 📌 Complaints per Department")
-            dep_counts = df["department"].value_counts()
-            st.bar_chart(dep_counts)
+            st.bar_chart(pd.Series(by.get("department", {})))
 
             st.markdown("### 🏙 Complaints per State")
-            state_counts = df["state"].value_counts()
-            st.bar_chart(state_counts)
+            st.bar_chart(pd.Series(by.get("state", {})))
 
             st.markdown("### 🟢 Resolved vs 🟡 Pending vs 🟠 In‑Progress")
-            status_counts = df["status"].value_counts()
-            st.bar_chart(status_counts)
+            st.bar_chart(pd.Series(by.get("status", {})))
 
             # IMAGE COUNT ANALYSIS
             st.markdown("### 🖼 Complaints with Image Attachments")
-            df["has_image"] = df["complaint_id"].isin(
-                [item["complaint_id"] for item in requests.get(f"{backend_url}/agent/history/user1").json().get("history", []) if item.get("attachments")]
+            image_counts = pd.Series(by.get("has_attachment", {})).rename(
+                {"true": "With Image", "false": "Without Image"}
             )
-            image_counts = df["has_image"].value_counts().rename({True: "With Image", False: "Without Image"})
             st.bar_chart(image_counts)
 
     except Exception as e:
         st.error(f"Error loading dashboard: {e}")
-
@@ -0,0 +1,127 @@
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BACKEND_URL = os.environ.get("CIVICASSIST_BACKEND_URL",
+                                     "https://civicassist-capstone-project-1.onrender.com")
+
+# (connect, read) seconds; a sleeping Render instance takes a while to wake up
+TIMEOUT = (5, 60)
+UPLOAD_TIMEOUT = (5, 120)
+# Reruns within this many seconds reuse the last response without asking
+# the backend; after that a conditional request revalidates it.
+CACHE_TTL = 30
+HISTORY_PAGE_SIZE = 10
+MAX_VALIDATED = 64
+
+
+class BackendError(Exception):
+    pass
+
+
+class _Backend:
+    """One pooled keep-alive session per backend URL, shared by every
+    Streamlit session, plus the last body and ETag of each GET so expired
+    cache entries can be revalidated with If-None-Match instead of
+    downloaded again."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        retry = Retry(total=3, connect=3, read=2, backoff_factor=0.5,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET", "HEAD"}),
+                      respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._validated = OrderedDict()
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def get(self, path: str, params=None, as_text=False):
+        key = (path, tuple(sorted((params or {}).items())), as_text)
+        with self._lock:
+            cached = self._validated.get(key)
+
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        try:
+            r = self.session.get(self.url(path), params=params, headers=headers, timeout=TIMEOUT)
+        except requests.RequestException as e:
+            raise BackendError(f"Could not reach the backend: {e}") from e
+
+        if r.status_code == 304 and cached:
+            with self._lock:
+                self._validated.move_to_end(key)
+            return cached[1]
+        if r.status_code >= 400:
+            raise BackendError(f"{path} returned {r.status_code}: {r.text[:200]}")
+
+        body = r.text if as_text else r.json()
+        etag = r.headers.get("ETag")
+        if etag:
+            with self._lock:
+                self._validated[key] = (etag, body)
+                self._validated.move_to_end(key)
+                while len(self._validated) > MAX_VALIDATED:
+                    self._validated.popitem(last=False)
+        return body
+
+    def post(self, path: str, timeout=TIMEOUT, **kwargs):
+        try:
+            r = self.session.post(self.url(path), timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            raise BackendError(f"Could not reach the backend: {e}") from e
+        if r.status_code >= 400:
+            raise BackendError(f"{path} returned {r.status_code}: {r.text[:200]}")
+        return r.json()
+
+
+@st.cache_resource(show_spinner=False)
+def backend(base_url: str) -> _Backend:
+    return _Backend(base_url)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def history_page(base_url: str, user_id: str, cursor=None, limit=HISTORY_PAGE_SIZE) -> dict:
+    params = {"limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    return backend(base_url).get(f"/agent/history/{requests.utils.quote(user_id, safe='')}", params)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def analytics_summary(base_url: str) -> dict:
+    return backend(base_url).get("/analytics/summary")
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def complaints_csv(base_url: str) -> str:
+    # requests asks for gzip, which the backend streams compressed
+    return backend(base_url).get("/memory/csv", as_text=True)
+
+
+def upload_attachment(base_url: str, uploaded) -> dict:
+    uploaded.seek(0)
+    return backend(base_url).post("/attachments", timeout=UPLOAD_TIMEOUT,
+                                  files={"file": (uploaded.name, uploaded, uploaded.type)})
+
+
+def resolve(base_url: str, payload: dict) -> dict:
+    result = backend(base_url).post("/agent/resolve", json=payload)
+    # the new complaint should show up right away, not after CACHE_TTL
+    history_page.clear()
+    analytics_summary.clear()
+    complaints_csv.clear()
+    return result
+
+
+def attachment_url(base_url: str, attachment: dict) -> str:
+    suffix = "/thumbnail" if attachment.get("thumbnail") else ""
+    return f"{backend(base_url).base_url}/attachments/{attachment['id']}{suffix}"